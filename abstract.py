@@ -28,6 +28,11 @@ Like this: 'class Player(abstract.AbstractPlayer):'
         """
         raise NotImplementedError
 
+    def close(self):
+        """Releasing the resources held by the player (processes, threads), called by the runner when the game ends.
+        """
+        pass
+
     def __repr__(self):
         return self.color
 
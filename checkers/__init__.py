@@ -1 +1,8 @@
+from .board import GameState
+from .bitboard import BitboardGameState
 
+# The available game state implementations, selectable per run by name.
+STATE_ENGINES = {
+    'dict': GameState,
+    'bitboard': BitboardGameState,
+}
@@ -0,0 +1,519 @@
+"""A bitboard implementation of the game state.
+
+The 32 playable squares are numbered row by row, 4 squares per row, so location (i, j) is square
+4 * i + j // 2. The position is kept as three integers (red pieces, black pieces, kings) and the moves
+are generated with shifts, masks and per square tables instead of walking the board dict. The board dict
+is still kept beside them, for the evaluations.
+"""
+from __future__ import print_function, division
+from .consts import *
+from .moves import *
+from .zobrist import ZOBRIST_TOOLS, ZOBRIST_SWAP_PLAYER, compute_zobrist_key
+from .eval_terms import add_piece, remove_piece, compute_eval_terms, board_order_locs, get_term, COUNT
+
+#===============================================================================
+# Square Tables
+#===============================================================================
+
+SQUARES = [(i, j)
+           for i in range(BOARD_ROWS)
+           for j in range(BOARD_COLS)
+           if IS_BLACK_TILE((i, j))]
+SQUARE_INDEX = {loc: s for s, loc in enumerate(SQUARES)}
+SQUARE_BIT = {loc: 1 << s for s, loc in enumerate(SQUARES)}
+
+ALL_SQUARES = (1 << len(SQUARES)) - 1
+EVEN_ROWS = sum(SQUARE_BIT[loc] for loc in SQUARES if loc[0] % 2 == 0)
+ODD_ROWS = ALL_SQUARES & ~EVEN_ROWS
+
+
+def row_mask(row):
+    return sum(SQUARE_BIT[loc] for loc in SQUARES if loc[0] == row)
+
+
+# The squares on which a pawn of each player is turned to a king.
+PROMOTION_ROW = {
+    RED_PLAYER: row_mask(BACK_ROW[RED_PLAYER]),
+    BLACK_PLAYER: row_mask(BACK_ROW[BLACK_PLAYER]),
+}
+
+
+def calc_direction(single_moves):
+    """Translating a direction dict of moves.py into a shift per row parity.
+
+    Because of the 4 squares per row numbering, the distance between a square and its neighbour in a
+    given direction depends only on the parity of the row. Squares without a neighbour in that
+    direction are left out of the masks.
+    :return: A 4-tuple: (even rows mask, even rows shift, odd rows mask, odd rows shift)
+    """
+    masks = [0, 0]
+    shifts = [0, 0]
+    for loc, next_loc in single_moves.items():
+        parity = loc[0] % 2
+        masks[parity] |= SQUARE_BIT[loc]
+        shifts[parity] = SQUARE_INDEX[next_loc] - SQUARE_INDEX[loc]
+    return masks[0], shifts[0], masks[1], shifts[1]
+
+
+DOWN_RIGHT = calc_direction(DOWN_RIGHT_SINGLE_MOVES)
+DOWN_LEFT = calc_direction(DOWN_LEFT_SINGLE_MOVES)
+UP_RIGHT = calc_direction(UP_RIGHT_SINGLE_MOVES)
+UP_LEFT = calc_direction(UP_LEFT_SINGLE_MOVES)
+
+# The directions each tool may move in, ordered like the single moves dicts of moves.py.
+PAWN_DIRECTIONS = {
+    RED_PLAYER: (DOWN_RIGHT, DOWN_LEFT),
+    BLACK_PLAYER: (UP_RIGHT, UP_LEFT),
+}
+KING_DIRECTIONS = (UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT)
+OPPOSITE_DIRECTION = {
+    DOWN_RIGHT: UP_LEFT,
+    DOWN_LEFT: UP_RIGHT,
+    UP_RIGHT: DOWN_LEFT,
+    UP_LEFT: DOWN_RIGHT,
+}
+
+
+def shift(bb, direction):
+    """Moving every square in bb one step in the given direction, dropping squares that fall off the board.
+    """
+    even_mask, even_shift, odd_mask, odd_shift = direction
+    even = bb & even_mask
+    odd = bb & odd_mask
+    even = even << even_shift if even_shift > 0 else even >> -even_shift
+    odd = odd << odd_shift if odd_shift > 0 else odd >> -odd_shift
+    return even | odd
+
+
+def iter_bits(bb):
+    """Yielding the single-bit integers of bb, from the lowest square to the highest.
+    """
+    while bb:
+        bit = bb & -bb
+        yield bit
+        bb ^= bit
+
+
+def bit_loc(bit):
+    return SQUARES[bit.bit_length() - 1]
+
+
+# single-bit integer: the location of its square.
+BIT_LOC = {1 << s: loc for s, loc in enumerate(SQUARES)}
+# The board dict of an empty board, copied to build the board dict of a position.
+EMPTY_BOARD = {(i, j): EM
+               for j in range(BOARD_COLS)
+               for i in range(BOARD_ROWS)}
+# The (bit, location) of every square, in the order of the board dicts.
+BOARD_ORDER_SQUARES = [(SQUARE_BIT[loc], loc) for loc in board_order_locs(SQUARES)]
+
+
+def calc_steps(direction):
+    """The single moves in the given direction, looked up by their target square.
+
+    :return: A dict of target bit: (origin location, target location)
+    """
+    back = OPPOSITE_DIRECTION[direction]
+    return {bit: (bit_loc(shift(bit, back)), loc)
+            for bit, loc in BIT_LOC.items()
+            if shift(bit, back)}
+
+
+def calc_jumps(direction):
+    """The jumps in the given direction, looked up by their origin square.
+
+    :return: A dict of origin bit: (jumped bit, landing bit)
+    """
+    return {bit: (shift(bit, direction), shift(shift(bit, direction), direction))
+            for bit in BIT_LOC
+            if shift(shift(bit, direction), direction)}
+
+
+def calc_shifter(direction):
+    """A function of a bitboard that does what shift does in the given direction, without its branches.
+    """
+    even_mask, even_shift, odd_mask, odd_shift = direction
+    # In every direction both row parities shift the same way.
+    if even_shift > 0:
+        return lambda bb: ((bb & even_mask) << even_shift) | ((bb & odd_mask) << odd_shift)
+    return lambda bb: ((bb & even_mask) >> -even_shift) | ((bb & odd_mask) >> -odd_shift)
+
+
+# direction: (its shifter, the shifter of the opposite direction, its single moves, its jumps). The tables of the
+# directions each tool moves in are looked up once for a position, rather than once for every square.
+DIRECTION_TABLES = {direction: (calc_shifter(direction), calc_shifter(OPPOSITE_DIRECTION[direction]),
+                                calc_steps(direction), calc_jumps(direction))
+                    for direction in KING_DIRECTIONS}
+PAWN_TABLES = {player: tuple(DIRECTION_TABLES[direction] for direction in directions)
+               for player, directions in PAWN_DIRECTIONS.items()}
+KING_TABLES = tuple(DIRECTION_TABLES[direction] for direction in KING_DIRECTIONS)
+
+
+#===============================================================================
+# Game State
+#===============================================================================
+
+class BitboardGameState:
+    # When True, the incremental Zobrist key is compared to a full recalculation after every move.
+    DEBUG_ZOBRIST = False
+
+    def __init__(self):
+        """ Initializing the board and current player.
+        """
+        # player: the bits of the squares of its pieces, the kings included.
+        self.pieces = {
+            RED_PLAYER: row_mask(0) | row_mask(1) | row_mask(2),
+            BLACK_PLAYER: row_mask(BOARD_ROWS - 1) | row_mask(BOARD_ROWS - 2) | row_mask(BOARD_ROWS - 3),
+        }
+        self.kings = 0
+        self.curr_player = RED_PLAYER
+        self.turns_since_last_jump = 0
+        self.board = self.build_board()
+        self.zobrist_key = compute_zobrist_key(self.board, self.curr_player)
+        self.eval_terms = compute_eval_terms(self.board)
+        # The possible moves of this position, once calculated.
+        self._moves = None
+
+    @classmethod
+    def from_board(cls, board, curr_player, turns_since_last_jump=0):
+        """Building a bitboard state from a board dict, as held by checkers.board.GameState.
+        """
+        state = cls.__new__(cls)
+        state.pieces = {RED_PLAYER: 0, BLACK_PLAYER: 0}
+        state.kings = 0
+        for loc, val in board.items():
+            if val == EM:
+                continue
+            player = RED_PLAYER if val in MY_COLORS[RED_PLAYER] else BLACK_PLAYER
+            state.pieces[player] |= SQUARE_BIT[loc]
+            if val == KING_COLOR[player]:
+                state.kings |= SQUARE_BIT[loc]
+        state.curr_player = curr_player
+        state.turns_since_last_jump = turns_since_last_jump
+        state.board = state.build_board()
+        state.zobrist_key = compute_zobrist_key(board, curr_player)
+        state.eval_terms = compute_eval_terms(board)
+        state._moves = None
+        return state
+
+    def build_board(self):
+        """The position as a dict of (i, j): tool, like checkers.board.GameState.board.
+
+        The state keeps it as its board attribute, changed in place by every move, so the evaluations read it without
+        rebuilding it at every leaf. It must not be modified by the caller.
+        """
+        board = EMPTY_BOARD.copy()
+        for player in (RED_PLAYER, BLACK_PLAYER):
+            for bit in iter_bits(self.pieces[player]):
+                board[BIT_LOC[bit]] = KING_COLOR[player] if bit & self.kings else PAWN_COLOR[player]
+        return board
+
+    def piece_locs(self):
+        """The locations of the pieces of every tool type, as lists in the order of the board dict.
+        """
+        red_pawns, red_kings, black_pawns, black_kings = [], [], [], []
+        red = self.pieces[RED_PLAYER]
+        occupied = red | self.pieces[BLACK_PLAYER]
+        kings = self.kings
+        for bit, loc in BOARD_ORDER_SQUARES:
+            if bit & occupied:
+                if bit & red:
+                    (red_kings if bit & kings else red_pawns).append(loc)
+                else:
+                    (black_kings if bit & kings else black_pawns).append(loc)
+        return {RP: red_pawns, RK: red_kings, BP: black_pawns, BK: black_kings}
+
+    def piece_count(self, tool):
+        return get_term(self.eval_terms, tool, COUNT)
+
+    def empty_squares(self):
+        return ALL_SQUARES & ~(self.pieces[RED_PLAYER] | self.pieces[BLACK_PLAYER])
+
+    def calc_single_moves(self, promotions=None):
+        """Calculating all the possible single moves.
+        :param promotions: If True, only the moves that promote a pawn, if False, only the others.
+        :return: All the legitimate single moves for this game state.
+        """
+        player = self.curr_player
+        empty = self.empty_squares()
+        pawn_targets = empty
+        if promotions is not None:
+            pawn_targets &= PROMOTION_ROW[player] if promotions else ~PROMOTION_ROW[player]
+        single_moves = []
+        for tools, tables, tool_type, empty in ((self.pieces[player] & ~self.kings, PAWN_TABLES[player],
+                                                 PAWN_COLOR[player], pawn_targets),
+                                                (self.pieces[player] & self.kings if not promotions else 0,
+                                                 KING_TABLES, KING_COLOR[player], empty)):
+            if not tools:
+                continue
+            for step, _, steps, _ in tables:
+                targets = step(tools) & empty
+                while targets:
+                    bit = targets & -targets
+                    targets ^= bit
+                    origin_loc, target_loc = steps[bit]
+                    single_moves.append(GameMove(tool_type, origin_loc, target_loc))
+        return single_moves
+
+    def is_single_move(self, move):
+        """Whether the move is a legitimate single move of the current player, assuming there are no capture moves.
+        """
+        player = self.curr_player
+        origin = SQUARE_BIT.get(move.origin_loc, 0)
+        if not origin & self.pieces[player] or not SQUARE_BIT.get(move.target_loc, 0) & self.empty_squares():
+            return False
+        if origin & self.kings:
+            return move.player_type == KING_COLOR[player] and move.target_loc in KING_SINGLE_MOVES[move.origin_loc]
+        return move.player_type == PAWN_COLOR[player] and move.target_loc in PAWN_SINGLE_MOVES[player][move.origin_loc]
+
+    def calc_capture_moves(self):
+        """Calculating all the possible capture moves, but only the first step.
+        :return: All the legitimate single capture moves for this game state, as (origin, jumped, target) tuples.
+        """
+        player = self.curr_player
+        opponent = self.pieces[OPPONENT_COLOR[player]]
+        empty = self.empty_squares()
+        capture_moves = []
+        for tools, tables in ((self.pieces[player] & ~self.kings, PAWN_TABLES[player]),
+                              (self.pieces[player] & self.kings, KING_TABLES)):
+            while tools:
+                origin = tools & -tools
+                tools ^= origin
+                for _, _, _, jumps in tables:
+                    jump = jumps.get(origin)
+                    if jump is not None and jump[0] & opponent and jump[1] & empty:
+                        capture_moves.append((BIT_LOC[origin], BIT_LOC[jump[0]], BIT_LOC[jump[1]]))
+        return capture_moves
+
+    def find_capture_sequences(self, origin, tables):
+        """Calculating all possible capture sequences of the tool at the origin bit.
+
+        The origin square counts as empty during the sequence, and jumped tools stay on the board
+        until the move is performed, so they can neither be jumped again nor landed on. Sequences
+        that end at the same square with the same jumped tools lead to the same position, and only
+        the first of them is kept.
+        :param tables: The DIRECTION_TABLES of the directions the tool moves in.
+        :return: list of 2-tuples where:
+            [0] Sequence final bit
+            [1] tuple of jumped bits by this sequence
+        """
+        opponent = self.pieces[OPPONENT_COLOR[self.curr_player]]
+        empty = self.empty_squares() | origin
+
+        capture_seqs = []
+        stack = [(origin, 0, ())]
+        while stack:
+            cur, already_jumped, seq = stack.pop()
+            extended = False
+            for _, _, _, jumps in tables:
+                jump = jumps.get(cur)
+                if jump is None:
+                    continue
+                jumped, landing = jump
+                if jumped & opponent and not jumped & already_jumped and landing & empty:
+                    extended = True
+                    stack.append((landing, already_jumped | jumped, seq + (jumped,)))
+            if not extended and seq:
+                capture_seqs.append((cur, already_jumped, seq))
+        if len(capture_seqs) == 1:
+            return [(capture_seqs[0][0], capture_seqs[0][2])]
+        seen = set()
+        unique_seqs = []
+        for cur, already_jumped, seq in capture_seqs:
+            if (cur, already_jumped) not in seen:
+                seen.add((cur, already_jumped))
+                unique_seqs.append((cur, seq))
+        return unique_seqs
+
+    def get_possible_moves(self):
+        """Return a list of possible moves for this state.
+        Each possible move is represented by GameMove object.
+
+        The list is calculated once for each position, it must not be modified by the caller.
+        """
+        if self._moves is None:
+            self._moves = self.calc_possible_moves()
+        return self._moves
+
+    def has_any_move(self):
+        """Whether the current player has any legal move, without generating the moves.
+        """
+        if self._moves is not None:
+            return len(self._moves) > 0
+        player = self.curr_player
+        opponent = self.pieces[OPPONENT_COLOR[player]]
+        empty = self.empty_squares()
+        for tools, tables in ((self.pieces[player] & ~self.kings, PAWN_TABLES[player]),
+                              (self.pieces[player] & self.kings, KING_TABLES)):
+            if not tools:
+                continue
+            for step, _, _, _ in tables:
+                targets = step(tools)
+                if targets & empty or step(targets & opponent) & empty:
+                    return True
+        return False
+
+    def has_capture_move(self):
+        """Whether the current player has a capture move, without generating the moves.
+        """
+        player = self.curr_player
+        opponent = self.pieces[OPPONENT_COLOR[player]]
+        empty = self.empty_squares()
+        for tools, tables in ((self.pieces[player] & ~self.kings, PAWN_TABLES[player]),
+                              (self.pieces[player] & self.kings, KING_TABLES)):
+            if not tools:
+                continue
+            for step, _, _, _ in tables:
+                if step(step(tools) & opponent) & empty:
+                    return True
+        return False
+
+    def iter_moves(self, hash_move=None, order=None):
+        """Yielding the possible moves in stages, see moves.iter_staged_moves.
+        """
+        return iter_staged_moves(self, hash_move, order)
+
+    def calc_possible_moves(self):
+        """Calculating the possible moves of this state, see get_possible_moves.
+        """
+        player = self.curr_player
+        opponent = self.pieces[OPPONENT_COLOR[player]]
+        empty = self.empty_squares()
+        capture_moves = []
+        for tools, tables, tool_type in ((self.pieces[player] & ~self.kings, PAWN_TABLES[player], PAWN_COLOR[player]),
+                                         (self.pieces[player] & self.kings, KING_TABLES, KING_COLOR[player])):
+            if not tools:
+                continue
+            # Only the tools with a first jump are searched for sequences.
+            origins = 0
+            for step, back, _, _ in tables:
+                landings = step(step(tools) & opponent) & empty
+                if landings:
+                    origins |= back(back(landings))
+            while origins:
+                origin = origins & -origins
+                origins ^= origin
+                for target, seq in self.find_capture_sequences(origin, tables):
+                    capture_moves.append(GameMove(tool_type, BIT_LOC[origin], BIT_LOC[target],
+                                                  tuple(BIT_LOC[jumped] for jumped in seq)))
+        if capture_moves:
+            return capture_moves
+
+        # There were no capture moves. We return the single moves.
+        return self.calc_single_moves()
+
+    def perform_move(self, move):
+        """Performing the move on this state.
+        :return: An undo record, to restore the state before the move with undo_move.
+        """
+        player = self.curr_player
+        board = self.board
+        origin = SQUARE_BIT[move.origin_loc]
+        target = SQUARE_BIT[move.target_loc]
+        origin_val = KING_COLOR[player] if origin & self.kings else PAWN_COLOR[player]
+        jumped_vals = []
+        undo_record = (move, self.pieces[RED_PLAYER], self.pieces[BLACK_PLAYER], self.kings,
+                       self.turns_since_last_jump, self.zobrist_key, self.eval_terms, self._moves, origin_val,
+                       jumped_vals)
+        key = self.zobrist_key ^ ZOBRIST_SWAP_PLAYER
+        key ^= ZOBRIST_TOOLS[(move.origin_loc, origin_val)]
+        # The terms list is replaced rather than changed, so the undo record keeps the previous one.
+        terms = self.eval_terms[:]
+        remove_piece(terms, move.origin_loc, origin_val)
+
+        self.pieces[player] = (self.pieces[player] & ~origin) | target
+        self.kings &= ~origin
+        board[move.origin_loc] = EM
+        if move.player_type == KING_COLOR[player] or target & PROMOTION_ROW[player]:
+            # If moved pawn to back row, turn to king
+            self.kings |= target
+            target_val = KING_COLOR[player]
+        else:
+            target_val = PAWN_COLOR[player]
+        key ^= ZOBRIST_TOOLS[(move.target_loc, target_val)]
+        add_piece(terms, move.target_loc, target_val)
+        board[move.target_loc] = target_val
+
+        opponent = OPPONENT_COLOR[player]
+        if move.jumped_locs:
+            for loc in move.jumped_locs:
+                bit = SQUARE_BIT[loc]
+                jumped_val = KING_COLOR[opponent] if bit & self.kings else PAWN_COLOR[opponent]
+                jumped_vals.append(jumped_val)
+                key ^= ZOBRIST_TOOLS[(loc, jumped_val)]
+                remove_piece(terms, loc, jumped_val)
+                self.pieces[opponent] &= ~bit
+                self.kings &= ~bit
+                board[loc] = EM
+            self.turns_since_last_jump = 0
+        else:
+            self.turns_since_last_jump += 0.5
+
+        # Updating the current player.
+        self.curr_player = opponent
+        self._moves = None
+        self.zobrist_key = key
+        self.eval_terms = terms
+        if self.DEBUG_ZOBRIST:
+            self.verify_zobrist_key()
+        return undo_record
+
+    def undo_move(self, undo_record):
+        """Restoring the state before a move.
+        :param undo_record: The record returned by perform_move. Moves must be undone in reverse order.
+        """
+        (move, self.pieces[RED_PLAYER], self.pieces[BLACK_PLAYER], self.kings, self.turns_since_last_jump,
+         self.zobrist_key, self.eval_terms, self._moves, origin_val, jumped_vals) = undo_record
+        self.curr_player = OPPONENT_COLOR[self.curr_player]
+        # The target is cleared first, a capture sequence may end on its origin.
+        board = self.board
+        board[move.target_loc] = EM
+        board[move.origin_loc] = origin_val
+        for loc, jumped_val in zip(move.jumped_locs, jumped_vals):
+            board[loc] = jumped_val
+        if self.DEBUG_ZOBRIST:
+            self.verify_zobrist_key()
+
+    def verify_zobrist_key(self):
+        """A debug check of the incremental Zobrist key against a full recalculation.
+        :raises AssertionError: If the keys are different.
+        """
+        full_key = compute_zobrist_key(self.board, self.curr_player)
+        assert self.zobrist_key == full_key, 'Zobrist key {:#x} != recalculated {:#x}'.format(self.zobrist_key,
+                                                                                            full_key)
+
+    def draw_board(self):
+        board = self.board
+        print("  " + " ".join([str(i) for i in range(BOARD_COLS)]))
+        line_sep = " +" + "-+" * BOARD_COLS
+        print(line_sep)
+        for i in range(BOARD_ROWS):
+            print(str(i) + "|" + "|".join([board[(i, j)]
+                                           for j in range(BOARD_COLS)]) + "|")
+            print(line_sep)
+        print("\n" + self.curr_player + " Player Turn!\n\n")
+
+    def __deepcopy__(self, memo):
+        # The integers are immutable, so only the board dict is copied.
+        state = self.__class__.__new__(self.__class__)
+        state.pieces = dict(self.pieces)
+        state.kings = self.kings
+        state.curr_player = self.curr_player
+        state.turns_since_last_jump = self.turns_since_last_jump
+        state.board = dict(self.board)
+        state.zobrist_key = self.zobrist_key
+        # The terms list is never changed in place, so it is shared, and so is the moves list.
+        state.eval_terms = self.eval_terms
+        state._moves = self._moves
+        return state
+
+    def __hash__(self):
+        """This object can be inserted into a set or as dict key. NOTICE: Changing the object after it has been inserted
+        into a set or dict (as key) may have unpredicted results!!!
+        """
+        return self.zobrist_key
+
+    def __eq__(self, other):
+        return (isinstance(other, BitboardGameState) and self.zobrist_key == other.zobrist_key
+                and self.pieces == other.pieces and self.kings == other.kings
+                and self.curr_player == other.curr_player)
@@ -1,11 +1,18 @@
 """A game-specific implementations of utility functions.
 """
 from __future__ import print_function, division
+from bisect import insort
 from .consts import *
 from .moves import *
+from .zobrist import ZOBRIST_TOOLS, ZOBRIST_SWAP_PLAYER, compute_zobrist_key
+from .eval_terms import add_piece, remove_piece, compute_eval_terms, compute_piece_lists, board_order_locs, get_term, \
+    COUNT
 
 
 class GameState:
+    # When True, the incremental Zobrist key is compared to a full recalculation after every move.
+    DEBUG_ZOBRIST = False
+
     def __init__(self):
         """ Initializing the board and current player.
         """
@@ -26,88 +33,189 @@ class GameState:
                     
         self.curr_player = RED_PLAYER
         self.turns_since_last_jump = 0
+        self.zobrist_key = compute_zobrist_key(self.board, self.curr_player)
+        self.eval_terms = compute_eval_terms(self.board)
+        # tool: the sorted list of the locations of its pieces, changed in place by every move.
+        self.piece_lists = compute_piece_lists(self.board)
+        # The possible moves of this position, once calculated.
+        self._moves = None
+
+    @classmethod
+    def from_board(cls, board, curr_player, turns_since_last_jump=0):
+        """Building a state from a board dict of location: tool.
+        """
+        state = cls.__new__(cls)
+        state.board = {(i,j) : EM
+                       for j in range(BOARD_COLS)
+                       for i in range(BOARD_ROWS)}
+        state.board.update(board)
+        state.curr_player = curr_player
+        state.turns_since_last_jump = turns_since_last_jump
+        state.zobrist_key = compute_zobrist_key(state.board, curr_player)
+        state.eval_terms = compute_eval_terms(state.board)
+        state.piece_lists = compute_piece_lists(state.board)
+        state._moves = None
+        return state
+
+    def piece_locs(self):
+        """The locations of the pieces of every tool type, as lists in the order of the board dict.
+        """
+        return {tool: board_order_locs(locs) for tool, locs in self.piece_lists.items()}
 
-    def calc_single_moves(self):
+    def piece_count(self, tool):
+        return get_term(self.eval_terms, tool, COUNT)
+
+    def calc_single_moves(self, promotions=None):
         """Calculating all the possible single moves.
+        :param promotions: If True, only the moves that promote a pawn, if False, only the others.
         :return: All the legitimate single moves for this game state.
         """
-        single_pawn_moves = [GameMove(self.board[i], i, j) 
-                             for (i, js) in PAWN_SINGLE_MOVES[self.curr_player].items()
-                             if self.board[i] == PAWN_COLOR[self.curr_player]
-                             for j in js
-                             if self.board[j] == EM]
-        single_king_moves = [GameMove(self.board[i], i, j)
-                             for (i, js) in KING_SINGLE_MOVES.items()
-                             if self.board[i] == KING_COLOR[self.curr_player]
-                             for j in js
+        back_row = BACK_ROW[self.curr_player]
+        pawn = PAWN_COLOR[self.curr_player]
+        king = KING_COLOR[self.curr_player]
+        pawn_single_moves = PAWN_SINGLE_MOVES[self.curr_player]
+        # Only the squares of the pieces are visited, in the order of the rows as in the moves dicts.
+        single_pawn_moves = [GameMove(pawn, i, j) 
+                             for i in self.piece_lists[pawn]
+                             for j in pawn_single_moves[i]
+                             if self.board[j] == EM
+                             and (promotions is None or promotions == (j[0] == back_row))]
+        if promotions:
+            return single_pawn_moves
+        single_king_moves = [GameMove(king, i, j)
+                             for i in self.piece_lists[king]
+                             for j in KING_SINGLE_MOVES[i]
                              if self.board[j] == EM]
         return single_pawn_moves + single_king_moves
 
+    def is_single_move(self, move):
+        """Whether the move is a legitimate single move of the current player, assuming there are no capture moves.
+        """
+        if self.board.get(move.origin_loc) != move.player_type or self.board.get(move.target_loc) != EM:
+            return False
+        if move.player_type == PAWN_COLOR[self.curr_player]:
+            return move.target_loc in PAWN_SINGLE_MOVES[self.curr_player][move.origin_loc]
+        return (move.player_type == KING_COLOR[self.curr_player]
+                and move.target_loc in KING_SINGLE_MOVES[move.origin_loc])
+
     def calc_capture_moves(self):
         """Calculating all the possible capture moves, but only the first step.
         :return: All the legitimate single capture moves for this game state.
         """
+        pawn_capture_moves = PAWN_CAPTURE_MOVES[self.curr_player]
         capture_pawn_moves = [(i, j, k)
-                              for i, i_capts in PAWN_CAPTURE_MOVES[self.curr_player].items()
-                              if self.board[i] == PAWN_COLOR[self.curr_player]
-                              for j,k in i_capts
+                              for i in self.piece_lists[PAWN_COLOR[self.curr_player]]
+                              for j,k in pawn_capture_moves[i]
                               if self.board[j] in OPPONENT_COLORS[self.curr_player]
                               and self.board[k] == EM]
         capture_king_moves = [(i, j, k)
-                              for i, i_capts in KING_CAPTURE_MOVES.items()
-                              if self.board[i] == KING_COLOR[self.curr_player]
-                              for j,k in i_capts
+                              for i in self.piece_lists[KING_COLOR[self.curr_player]]
+                              for j,k in KING_CAPTURE_MOVES[i]
                               if self.board[j] in OPPONENT_COLORS[self.curr_player]
                               and self.board[k] == EM]
         return capture_pawn_moves + capture_king_moves
     
-    def find_all_capture_sequence(self, origin_loc, cur_loc, possible_moves, already_jumped):
-        """
-        Calculating all possible capture sequences from cur_loc, using moves in
-        possible_moves, avoiding jumping locations in already_jumped
-        
-        Arguments:
-        cur_loc: 2-tuple containing origin location for jump sequence
-        possible_moves: all jump moves allowed for player whos sequences we are calculating
-        already_jumped: list of 2-tuples of locations of players previously eaten in current sequence
-        
+    def find_capture_sequences(self, origin_loc):
+        """Calculating the capture sequences of the tool at origin_loc, using its jumps in TOOL_CAPTURE_MOVES.
+
+        The sequences are searched depth first with a stack of (location, jumped locations tuple), without recursion
+        and without copying lists at every step. The origin location counts as empty during the sequence, and jumped
+        tools stay on the board until the move is performed, so they can neither be jumped again nor landed on.
+        Sequences that end at the same location with the same jumped tools, like the two ways around a ring of tools,
+        lead to the same position, and only the first of them is kept.
         :return: list of 2-tuples where:
             [0] Sequence final location
-            [1] list of jumped tools by this sequence
+            [1] tuple of jumped tools by this sequence
         """
-        possible_next_jumps = [(jumped, next_loc)
-                               for jumped, next_loc in possible_moves[cur_loc]
-                               if self.board[jumped] in OPPONENT_COLORS[self.curr_player] # Jumping opponent tool
-                               and (self.board[next_loc] == EM or next_loc == origin_loc)# Target location is empty
-                               and jumped not in already_jumped] # I have not jumped this tool yet in this sequence
-        
+        board = self.board
+        opponents = OPPONENT_COLORS[self.curr_player]
+        capture_moves = TOOL_CAPTURE_MOVES[board[origin_loc]]
+
         capture_seqs = []
-        for jumped, next_loc in possible_next_jumps:
-            cur_seqs = self.find_all_capture_sequence(origin_loc,
-                                                      next_loc, 
-                                                      possible_moves,
-                                                      already_jumped + [jumped])
-            for target, seq in cur_seqs:
-                capture_seqs.append((target, [jumped] + seq))
-        
-        if len(capture_seqs) == 0:
-            return [(cur_loc,[])]
-        else:
+        stack = [(origin_loc, ())]
+        while stack:
+            cur_loc, jumped_locs = stack.pop()
+            extended = False
+            # Pushed in reverse, so the sequences are popped in the order of the jumps.
+            for jumped, next_loc in reversed(capture_moves[cur_loc]):
+                if (board[jumped] in opponents # Jumping opponent tool
+                    and (board[next_loc] == EM or next_loc == origin_loc) # Target location is empty
+                    and jumped not in jumped_locs): # I have not jumped this tool yet in this sequence
+                    extended = True
+                    stack.append((next_loc, jumped_locs + (jumped,)))
+            if not extended and jumped_locs:
+                capture_seqs.append((cur_loc, jumped_locs))
+        if len(capture_seqs) == 1:
             return capture_seqs
+
+        unique_seqs = []
+        seen = set()
+        for cur_loc, jumped_locs in capture_seqs:
+            result = (cur_loc, frozenset(jumped_locs))
+            if result not in seen:
+                seen.add(result)
+                unique_seqs.append((cur_loc, jumped_locs))
+        return unique_seqs
     
     def get_possible_moves(self):
         """Return a list of possible moves for this state.
         Each possible move is represented by GameMove object.
+
+        The list is calculated once for each position, it must not be modified by the caller.
+        """
+        if self._moves is None:
+            self._moves = self.calc_possible_moves()
+        return self._moves
+
+    def has_any_move(self):
+        """Whether the current player has any legal move, stopping at the first one found.
+        """
+        if self._moves is not None:
+            return len(self._moves) > 0
+        player = self.curr_player
+        opponents = OPPONENT_COLORS[player]
+        board = self.board
+        for locs, single_moves, capture_moves in ((self.piece_lists[PAWN_COLOR[player]], PAWN_SINGLE_MOVES[player],
+                                                   PAWN_CAPTURE_MOVES[player]),
+                                                  (self.piece_lists[KING_COLOR[player]], KING_SINGLE_MOVES,
+                                                   KING_CAPTURE_MOVES)):
+            for loc in locs:
+                for target in single_moves[loc]:
+                    if board[target] == EM:
+                        return True
+                for jumped, target in capture_moves[loc]:
+                    if board[jumped] in opponents and board[target] == EM:
+                        return True
+        return False
+
+    def has_capture_move(self):
+        """Whether the current player has a capture move, stopping at the first one found.
+        """
+        player = self.curr_player
+        opponents = OPPONENT_COLORS[player]
+        board = self.board
+        for locs, capture_moves in ((self.piece_lists[PAWN_COLOR[player]], PAWN_CAPTURE_MOVES[player]),
+                                    (self.piece_lists[KING_COLOR[player]], KING_CAPTURE_MOVES)):
+            for loc in locs:
+                for jumped, target in capture_moves[loc]:
+                    if board[jumped] in opponents and board[target] == EM:
+                        return True
+        return False
+
+    def iter_moves(self, hash_move=None, order=None):
+        """Yielding the possible moves in stages, see moves.iter_staged_moves.
+        """
+        return iter_staged_moves(self, hash_move, order)
+
+    def calc_possible_moves(self):
+        """Calculating the possible moves of this state, see get_possible_moves.
         """
         possible_capture_moves = self.calc_capture_moves()
         if possible_capture_moves:
             capture_origins = set(origin for origin,_,_ in possible_capture_moves)
             capture_seqs = []
             for origin in capture_origins:
-                cur_seqs = self.find_all_capture_sequence(origin, origin,
-                                                          TOOL_CAPTURE_MOVES[self.board[origin]], 
-                                                          [])
-                for target, seq in cur_seqs:
+                for target, seq in self.find_capture_sequences(origin):
                     capture_seqs.append(GameMove(self.board[origin], origin, target, seq))
                     
             return capture_seqs
@@ -116,17 +224,36 @@ class GameState:
         return self.calc_single_moves()
 
     def perform_move(self, move):
+        """Performing the move on this state.
+        :return: An undo record, to restore the state before the move with undo_move.
+        """
+        origin_val = self.board[move.origin_loc]
+        jumped_vals = [self.board[loc] for loc in move.jumped_locs]
+        undo_record = (move, origin_val, jumped_vals, self.turns_since_last_jump, self.zobrist_key, self.eval_terms,
+                       self._moves)
         self.board[move.origin_loc] = EM
         if (move.player_type == PAWN_COLOR[self.curr_player]
             and move.target_loc[0] == BACK_ROW[self.curr_player]):
             # If moved pawn to back row, turn to king and put in target
-            self.board[move.target_loc] = KING_COLOR[self.curr_player]
+            target_val = KING_COLOR[self.curr_player]
         else:
             # Move tool to target
-            self.board[move.target_loc] = move.player_type
+            target_val = move.player_type
+        self.board[move.target_loc] = target_val
+        self.piece_lists[origin_val].remove(move.origin_loc)
+        insort(self.piece_lists[target_val], move.target_loc)
+        key = self.zobrist_key ^ ZOBRIST_TOOLS[(move.origin_loc, origin_val)] ^ ZOBRIST_TOOLS[
+            (move.target_loc, target_val)] ^ ZOBRIST_SWAP_PLAYER
+        # The terms list is replaced rather than changed, so the undo record keeps the previous one.
+        terms = self.eval_terms[:]
+        remove_piece(terms, move.origin_loc, origin_val)
+        add_piece(terms, move.target_loc, target_val)
         
-        for loc in move.jumped_locs:
+        for loc, val in zip(move.jumped_locs, jumped_vals):
             self.board[loc] = EM
+            self.piece_lists[val].remove(loc)
+            key ^= ZOBRIST_TOOLS[(loc, val)]
+            remove_piece(terms, loc, val)
         if len(move.jumped_locs) > 0:
             self.turns_since_last_jump = 0
         else:
@@ -134,7 +261,42 @@ class GameState:
         
         # Updating the current player.
         self.curr_player = OPPONENT_COLOR[self.curr_player]
-        
+        self.zobrist_key = key
+        self.eval_terms = terms
+        self._moves = None
+        if self.DEBUG_ZOBRIST:
+            self.verify_zobrist_key()
+        return undo_record
+
+    def undo_move(self, undo_record):
+        """Restoring the state before a move.
+        :param undo_record: The record returned by perform_move. Moves must be undone in reverse order.
+        """
+        move, origin_val, jumped_vals, turns_since_last_jump, zobrist_key, eval_terms, moves = undo_record
+        # The target is cleared first, as a capture sequence may end where it started.
+        self.piece_lists[self.board[move.target_loc]].remove(move.target_loc)
+        insort(self.piece_lists[origin_val], move.origin_loc)
+        self.board[move.target_loc] = EM
+        self.board[move.origin_loc] = origin_val
+        for loc, val in zip(move.jumped_locs, jumped_vals):
+            self.board[loc] = val
+            insort(self.piece_lists[val], loc)
+        self.turns_since_last_jump = turns_since_last_jump
+        self.curr_player = OPPONENT_COLOR[self.curr_player]
+        self.zobrist_key = zobrist_key
+        self.eval_terms = eval_terms
+        self._moves = moves
+        if self.DEBUG_ZOBRIST:
+            self.verify_zobrist_key()
+
+    def verify_zobrist_key(self):
+        """A debug check of the incremental Zobrist key against a full recalculation.
+        :raises AssertionError: If the keys are different.
+        """
+        full_key = compute_zobrist_key(self.board, self.curr_player)
+        assert self.zobrist_key == full_key, 'Zobrist key {:#x} != recalculated {:#x}'.format(self.zobrist_key,
+                                                                                            full_key)
+
     def draw_board(self):
         print("  " + " ".join([str(i) for i in range(BOARD_COLS)]))
         line_sep = " +" + "-+"*BOARD_COLS
@@ -145,14 +307,26 @@ class GameState:
             print(line_sep)
         print("\n" + self.curr_player + " Player Turn!\n\n")
 
+    def __deepcopy__(self, memo):
+        # The tools are strings and the moves are never changed, so only the containers of the position are copied.
+        state = self.__class__.__new__(self.__class__)
+        state.board = dict(self.board)
+        state.curr_player = self.curr_player
+        state.turns_since_last_jump = self.turns_since_last_jump
+        state.zobrist_key = self.zobrist_key
+        state.eval_terms = self.eval_terms[:]
+        state.piece_lists = {tool: locs[:] for tool, locs in self.piece_lists.items()}
+        state._moves = self._moves
+        return state
+
     def __hash__(self):
         """This object can be inserted into a set or as dict key. NOTICE: Changing the object after it has been inserted
         into a set or dict (as key) may have unpredicted results!!!
         """
-        return hash(','.join([self.board[(i,j)]
-                              for i in range(BOARD_ROWS)
-                              for j in range(BOARD_COLS)] + [self.curr_player]))
+        return self.zobrist_key
 
     def __eq__(self, other):
-        return isinstance(other, GameState) and self.board == other.board and self.curr_player == other.curr_player
+        # Different keys are always different states, the board is compared only to rule out a key collision.
+        return (isinstance(other, GameState) and self.zobrist_key == other.zobrist_key
+                and self.curr_player == other.curr_player and self.board == other.board)
 
@@ -0,0 +1,101 @@
+"""
+Evaluation terms kept incrementally by the game states: for every tool type, sums over its pieces that a move
+changes only at the locations it moves, promotes or removes tools. The evaluations read them at the leaves
+instead of rescanning the board for them.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+from .consts import (BOARD_ROWS, BOARD_COLS,
+                     IS_BLACK_TILE, EM,
+                     RP, RK, BP, BK)
+
+#===============================================================================
+# Terms
+#===============================================================================
+
+# The terms of each tool type.
+COUNT = 0  # The number of pieces.
+EDGE_ROWS = 1  # The number of pieces in the first or last row.
+EDGE_COLS = 2  # The number of pieces in the first or last column, and not in an edge row.
+ROW_SUM = 3  # The sum of the rows of the pieces.
+TERMS_NUM = 4
+
+# The terms are kept in a flat list, the index of a term of a tool is TOOL_OFFSET[tool] + term.
+TOOL_OFFSET = {tool: i * TERMS_NUM for i, tool in enumerate((RP, RK, BP, BK))}
+
+
+def loc_terms(loc):
+    """The terms of a single piece at the given location, by term.
+    """
+    r, c = loc
+    edge_row = r == 0 or r == BOARD_ROWS - 1
+    edge_col = c == 0 or c == BOARD_COLS - 1
+    return 1, int(edge_row), int(edge_col and not edge_row), r
+
+# (location, tool): the (index, value) pairs a piece adds to the terms, for every playable location and every tool.
+PIECE_TERMS = {((i, j), tool): tuple((TOOL_OFFSET[tool] + term, value)
+                                     for term, value in enumerate(loc_terms((i, j)))
+                                     if value)
+               for i in range(BOARD_ROWS)
+               for j in range(BOARD_COLS)
+               if IS_BLACK_TILE((i, j))
+               for tool in (RP, RK, BP, BK)}
+
+
+def add_piece(terms, loc, tool):
+    for index, value in PIECE_TERMS[(loc, tool)]:
+        terms[index] += value
+
+
+def remove_piece(terms, loc, tool):
+    for index, value in PIECE_TERMS[(loc, tool)]:
+        terms[index] -= value
+
+
+def compute_eval_terms(board):
+    """Calculating the terms of a position from scratch.
+
+    :param board: A dict of location: tool, as in checkers.board.GameState.board.
+    :return: The terms list, see TOOL_OFFSET.
+    """
+    terms = [0] * (len(TOOL_OFFSET) * TERMS_NUM)
+    for loc, val in board.items():
+        if val != EM:
+            add_piece(terms, loc, val)
+    return terms
+
+
+def compute_piece_lists(board):
+    """The locations of the pieces of every tool type, as lists sorted by rows, the order of the moves dicts.
+    """
+    piece_lists = {tool: [] for tool in TOOL_OFFSET}
+    for loc in sorted(board):
+        if board[loc] != EM:
+            piece_lists[board[loc]].append(loc)
+    return piece_lists
+
+
+# location: its index in the iteration order of the board dicts, column by column.
+BOARD_ORDER = {(i, j): n
+               for n, (i, j) in enumerate((i, j) for j in range(BOARD_COLS) for i in range(BOARD_ROWS))}
+
+
+def board_order_locs(locs):
+    """The locations sorted in the order of the board dicts, the order a scan of the board finds the pieces in.
+    """
+    return sorted(locs, key=BOARD_ORDER.__getitem__)
+
+
+def get_term(terms, tool, term):
+    return terms[TOOL_OFFSET[tool] + term]
+
+
+def edge_row_distance_sum(terms, tool, edge_row):
+    """The sum of the distances in rows of the pieces of a tool type from an edge row, abs(edge_row - r) for each.
+    """
+    if edge_row == 0:
+        return terms[TOOL_OFFSET[tool] + ROW_SUM]
+    return edge_row * terms[TOOL_OFFSET[tool] + COUNT] - terms[TOOL_OFFSET[tool] + ROW_SUM]
@@ -16,19 +16,22 @@ from .consts import (RED_PLAYER, BLACK_PLAYER,
 #===============================================================================
 
 class GameMove:
-    def __init__(self, player_type, origin_loc, target_loc, jumped_locs = None):
+    # Many moves are created for every searched position, so they have no __dict__.
+    __slots__ = ('player_type', 'origin_loc', 'target_loc', 'jumped_locs')
+
+    def __init__(self, player_type, origin_loc, target_loc, jumped_locs = ()):
         """
         :param: player_type of the tool moved, could be RP, RK, BP, BK
         :param: origin_loc a 2-tuple defining the location on the board of the tool
         :param: target_loc a 2-tuple defining the location on the board we would like
             to move the tool to. In multiple jumps this is the final destination.
-        :param: jumped_locs is a list of tools we jumped during our move. If this
-            is None or an empty list, this is an ordinary move and not a jump
+        :param: jumped_locs is a tuple of tools we jumped during our move. If this
+            is None or empty, this is an ordinary move and not a jump
         """
         self.player_type = player_type
         self.origin_loc = origin_loc
         self.target_loc = target_loc
-        self.jumped_locs = jumped_locs if jumped_locs is not None else []
+        self.jumped_locs = tuple(jumped_locs) if jumped_locs is not None else ()
         
     def __str__(self):
         s = " ".join(["Move", self.player_type,
@@ -38,6 +41,15 @@ class GameMove:
             s += ", eat: " + ",".join([str(loc) for loc in self.jumped_locs])
         
         return s
+
+    def __eq__(self, other):
+        # Moves generated separately for the same position are equal, so they can be looked up between searches.
+        return (isinstance(other, GameMove) and self.origin_loc == other.origin_loc
+                and self.target_loc == other.target_loc and self.jumped_locs == other.jumped_locs
+                and self.player_type == other.player_type)
+
+    def __hash__(self):
+        return hash((self.origin_loc, self.target_loc, self.jumped_locs))
         
 #===============================================================================
 # Move Constants
@@ -135,3 +147,36 @@ TOOL_CAPTURE_MOVES = {
     BP : UP_CAPTURE_MOVES,
     BK : KING_CAPTURE_MOVES,
 }
+
+#===============================================================================
+# Staged Move Generation
+#===============================================================================
+
+def iter_staged_moves(state, hash_move=None, order=None):
+    """Yielding the possible moves of a state in stages, generating each stage only when the moves before it are used
+    up: the hash move, the capture moves, the moves that promote a pawn, and the other single moves.
+
+    Captures are mandatory, so when there are any, they are all the moves. Otherwise the hash move is checked with
+    state.is_single_move, and yielded before any single move is generated. A search that cuts off after the first
+    moves does not generate the rest.
+    :param state: A game state with has_capture_move, is_single_move and calc_single_moves(promotions).
+    :param hash_move: A move to yield first if it is legal in this state, e.g. from the transposition table.
+    :param order: An optional function that sorts the list of moves of a stage.
+    """
+    if state.has_capture_move():
+        moves = state.get_possible_moves()
+        stages = [lambda: moves]
+        if hash_move not in moves:
+            hash_move = None
+    else:
+        stages = [lambda: state.calc_single_moves(True), lambda: state.calc_single_moves(False)]
+        if hash_move is not None and (hash_move.jumped_locs or not state.is_single_move(hash_move)):
+            hash_move = None
+    if hash_move is not None:
+        yield hash_move
+    for calc_stage in stages:
+        moves = calc_stage()
+        if hash_move is not None:
+            moves = [move for move in moves if move != hash_move]
+        for move in (order(moves) if order is not None else moves):
+            yield move
@@ -0,0 +1,74 @@
+"""
+Perft: counting the move sequences of a position to a fixed depth, to check a move generator against known counts
+and to time it apart from the search. Every state engine must give the counts in PERFT_COUNTS, which were
+calculated with the dict engine.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+from .consts import PAWN_COLOR, BACK_ROW
+
+#===============================================================================
+# Counts
+#===============================================================================
+
+# The counts of each depth.
+NODES = 0  # The number of positions reached, the moves of the previous ply.
+CAPTURES = 1  # The number of capture moves among them.
+PROMOTIONS = 2  # The number of moves that turned a pawn into a king.
+COUNTS_NUM = 3
+
+# position name: the (nodes, captures, promotions) of every depth from 1, for the positions of positions.py.
+PERFT_COUNTS = {
+    'initial': [(7, 0, 0), (49, 0, 0), (302, 11, 0), (1469, 169, 0), (7361, 880, 0), (36768, 4290, 0),
+                (179740, 22320, 7), (845931, 112697, 4501)],
+    'opening': [(7, 0, 0), (55, 1, 0), (359, 15, 0), (2287, 148, 0), (13141, 1067, 78), (76971, 6347, 207)],
+    'opening exchange': [(9, 0, 0), (56, 3, 0), (364, 26, 1), (2263, 158, 6), (14920, 1007, 82), (89582, 6796, 399)],
+    'early middlegame': [(7, 0, 0), (58, 3, 2), (379, 17, 0), (2753, 166, 60), (15587, 1244, 86),
+                         (102333, 8184, 2647)],
+    'crowded center': [(11, 0, 0), (42, 6, 1), (180, 28, 0), (679, 137, 17), (3481, 375, 80), (14084, 2381, 435)],
+    'open middlegame': [(10, 0, 0), (59, 4, 0), (413, 19, 0), (1967, 264, 20), (11672, 938, 93), (51250, 8414, 1255)],
+    'black king behind': [(7, 0, 0), (61, 0, 0), (267, 32, 2), (1316, 131, 7), (5718, 863, 99), (26638, 3452, 307)],
+    'kings on both sides': [(7, 0, 0), (72, 2, 0), (402, 13, 0), (3529, 165, 6), (19413, 838, 122),
+                            (154420, 9636, 482)],
+    'thin middlegame': [(9, 0, 0), (40, 4, 2), (170, 25, 8), (739, 89, 45), (3231, 478, 157), (13061, 1944, 730)],
+    'red breakthrough': [(11, 0, 0), (58, 4, 0), (304, 38, 0), (1114, 204, 17), (6221, 602, 176), (22974, 4244, 439)],
+    'scattered': [(6, 0, 0), (24, 3, 2), (113, 11, 8), (423, 73, 28), (1828, 276, 167), (7079, 1171, 402)],
+    'black king raid': [(8, 0, 0), (28, 4, 0), (113, 18, 1), (465, 44, 8), (2032, 324, 57), (8513, 774, 337)],
+    'king endgame': [(6, 0, 0), (46, 1, 0), (293, 9, 0), (1706, 79, 0), (10418, 437, 7), (61254, 2814, 26)],
+    'mixed endgame': [(9, 0, 0), (45, 3, 1), (261, 15, 0), (1052, 77, 26), (5891, 318, 85), (24537, 1697, 564)],
+    'red kings up': [(6, 0, 0), (18, 0, 0), (123, 0, 0), (656, 0, 0), (4752, 0, 0), (22603, 361, 0)],
+    'pawn race': [(3, 0, 1), (18, 0, 3), (60, 0, 12), (356, 1, 59), (1304, 6, 136), (8282, 43, 1087)],
+    'king ring': [(1, 1, 0), (2, 0, 0), (10, 0, 0), (15, 0, 0), (78, 0, 0), (151, 5, 0)],
+    'crowded king ring': [(8, 8, 0), (92, 0, 24), (184, 0, 0), (1661, 29, 370), (4934, 150, 0), (40541, 1295, 7022)],
+}
+
+
+def perft(state, depth):
+    """Counting the positions reached from the state in every depth up to the given one.
+
+    The moves are performed and undone in place, so the state is the same when done.
+    :return: A list of the (nodes, captures, promotions) of every depth from 1.
+    """
+    counts = [[0] * COUNTS_NUM for _ in range(depth)]
+    if depth > 0:
+        count_moves(state, depth, counts, 0)
+    return [tuple(depth_counts) for depth_counts in counts]
+
+
+def count_moves(state, depth, counts, ply):
+    depth_counts = counts[ply]
+    pawn = PAWN_COLOR[state.curr_player]
+    back_row = BACK_ROW[state.curr_player]
+    for move in state.get_possible_moves():
+        depth_counts[NODES] += 1
+        if move.jumped_locs:
+            depth_counts[CAPTURES] += 1
+        if move.player_type == pawn and move.target_loc[0] == back_row:
+            depth_counts[PROMOTIONS] += 1
+        if ply + 1 < depth:
+            undo_record = state.perform_move(move)
+            count_moves(state, depth, counts, ply + 1)
+            state.undo_move(undo_record)
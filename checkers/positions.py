@@ -0,0 +1,70 @@
+"""
+A standard set of positions for benchmarks and regression checks of the move generation and the search.
+
+A position is written as 32 characters, one per playable square from the top row to the bottom one
+(left to right in each row), using the tool letters of consts.py and '.' for an empty square.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+from .consts import BOARD_ROWS, BOARD_COLS, IS_BLACK_TILE, EM, RED_PLAYER, BLACK_PLAYER
+
+#===============================================================================
+# Positions
+#===============================================================================
+
+PLAYABLE_LOCS = [(i, j)
+                 for i in range(BOARD_ROWS)
+                 for j in range(BOARD_COLS)
+                 if IS_BLACK_TILE((i, j))]
+
+EMPTY_SQUARE = '.'
+
+# (name, board, player to move)
+STANDARD_POSITIONS = [
+    ('initial', 'rrrrrrrrrrrr........bbbbbbbbbbbb', RED_PLAYER),
+    ('opening', 'rrrrrrrrrrr........bbb.bbb.bbbbb', RED_PLAYER),
+    ('opening exchange', 'rrrrr.rr....b..rr......bb.bbbbbb', BLACK_PLAYER),
+    ('early middlegame', 'r.rrrrrrr.r.....bb...b.b..b.bbbb', RED_PLAYER),
+    ('crowded center', 'rrr.rr.rr..r.b.r.b.b.bb.b..bbb.b', BLACK_PLAYER),
+    ('open middlegame', 'rrr..rrrrrr.r.b....bb.b.bb..bbbb', BLACK_PLAYER),
+    ('black king behind', 'rBrr..rrr.rr...b....b.bbb..bRb.b', RED_PLAYER),
+    ('kings on both sides', 'rrrr....rr.r......b.b..Rb...bb..', BLACK_PLAYER),
+    ('thin middlegame', 'rr....rr.r.r.r..brb...bbb..b..b.', RED_PLAYER),
+    ('red breakthrough', '..Brr....r.r..r.rr....bbb......b', RED_PLAYER),
+    ('scattered', '...r.r.br.rr.r...b..b.bbbb.bb...', BLACK_PLAYER),
+    ('black king raid', 'rB....r...r...r.b.r....b..b.b...', BLACK_PLAYER),
+    ('king endgame', '....B......r.B.rR.............Rb', RED_PLAYER),
+    ('mixed endgame', 'Br....Brb........r.R............', RED_PLAYER),
+    ('red kings up', 'B.B.........r...............R.R.', RED_PLAYER),
+    ('pawn race', '....r..b....r.........b..r..R...', BLACK_PLAYER),
+]
+
+# Positions with kings that can capture the same tools along several routes, for checks of the capture sequences.
+CAPTURE_POSITIONS = [
+    ('king ring', 'r.........R..bb......bb.....b...', RED_PLAYER),
+    ('crowded king ring', '.....bb...R.Bbb.....bbb.........', RED_PLAYER),
+]
+
+
+def encode_board(board):
+    return ''.join(EMPTY_SQUARE if board[loc] == EM else board[loc] for loc in PLAYABLE_LOCS)
+
+
+def decode_board(text):
+    return {loc: EM if val == EMPTY_SQUARE else val for loc, val in zip(PLAYABLE_LOCS, text)}
+
+
+def load_position(state_class, board_text, curr_player):
+    """Building a state of the given state engine from an encoded position.
+    """
+    return state_class.from_board(decode_board(board_text), curr_player)
+
+
+def standard_states(state_class, positions=STANDARD_POSITIONS):
+    """The standard positions as states of the given state engine.
+    """
+    return [load_position(state_class, board_text, curr_player)
+            for _, board_text, curr_player in positions]
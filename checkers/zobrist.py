@@ -0,0 +1,54 @@
+"""
+Zobrist hashing of game states: a fixed random 64-bit key per (square, tool) and per player to move.
+The key of a state is the XOR of the keys of its tools and of its current player, so a move updates
+it with a few XORs instead of a rescan of the board.
+"""
+
+#===============================================================================
+# Imports
+#===============================================================================
+
+import random
+from .consts import (RED_PLAYER, BLACK_PLAYER,
+                     BOARD_ROWS, BOARD_COLS,
+                     IS_BLACK_TILE, EM,
+                     RP, RK, BP, BK)
+
+#===============================================================================
+# Keys
+#===============================================================================
+
+# A fixed seed, so the keys are the same in every run (and every process).
+ZOBRIST_SEED = 20190501
+
+_rand = random.Random(ZOBRIST_SEED)
+
+# (location, tool): key, for every playable location and every tool.
+ZOBRIST_TOOLS = {((i, j), tool): _rand.getrandbits(64)
+                 for i in range(BOARD_ROWS)
+                 for j in range(BOARD_COLS)
+                 if IS_BLACK_TILE((i, j))
+                 for tool in (RP, RK, BP, BK)}
+
+# player: key, for the player to move.
+ZOBRIST_PLAYER = {
+    RED_PLAYER: _rand.getrandbits(64),
+    BLACK_PLAYER: _rand.getrandbits(64),
+}
+
+# XOR-ing this into a key swaps the player to move.
+ZOBRIST_SWAP_PLAYER = ZOBRIST_PLAYER[RED_PLAYER] ^ ZOBRIST_PLAYER[BLACK_PLAYER]
+
+
+def compute_zobrist_key(board, curr_player):
+    """Calculating the key of a position from scratch.
+
+    :param board: A dict of location: tool, as in checkers.board.GameState.board.
+    :param curr_player: The player to move.
+    :return: The 64-bit Zobrist key of the position.
+    """
+    key = ZOBRIST_PLAYER[curr_player]
+    for loc, val in board.items():
+        if val != EM:
+            key ^= ZOBRIST_TOOLS[(loc, val)]
+    return key
@@ -0,0 +1,58 @@
+"""A bounded cache of leaf evaluations, keyed by the Zobrist key and the player to move of the position.
+"""
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    def __init__(self, max_entries):
+        """Initialize an empty cache.
+
+        :param max_entries: The maximal number of cached evaluations. When the cache is full, the least recently
+                            used evaluation is evicted.
+        """
+        self.max_entries = max_entries
+        # (key, player to move): utility, the least recently used first.
+        self.entries = OrderedDict()
+        # The evaluation weights the cached utilities were calculated with.
+        self.weights = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_weights(self, weights):
+        """Declaring the weights of the evaluation. The cache is cleared if they are different from before.
+
+        :param weights: A hashable description of the evaluation weights.
+        """
+        if weights != self.weights:
+            self.entries.clear()
+            self.weights = weights
+
+    def get(self, state):
+        """Looking up the utility of a state.
+
+        :return: The cached utility, or None if missing.
+        """
+        key = (state.zobrist_key, state.curr_player)
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, state, value):
+        self.entries[(state.zobrist_key, state.curr_player)] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        return 'evaluation cache: {} entries, {} hits of {} ({:.1%}), {} evictions'.format(
+            len(self.entries), self.hits, lookups, self.hits / lookups if lookups else 0, self.evictions)
@@ -0,0 +1,101 @@
+"""Move ordering for the MiniMax search: the order in which the moves of a node are searched.
+
+Alpha-beta prunes the most when the best move is searched first. The moves are ranked by:
+1. The principal variation move of the previous iteration at the root, or the transposition table move.
+2. Captures (longest first) and promotions.
+3. Killer moves: quiet moves that caused a cutoff at the same ply in a sibling node.
+4. The history heuristic: quiet moves ranked by the cutoffs they caused anywhere in the search.
+"""
+from collections import defaultdict
+from checkers.consts import RP, BP, BACK_ROW, RED_PLAYER, BLACK_PLAYER
+
+# The row a pawn of each type is promoted on.
+PROMOTION_ROW = {
+    RP: BACK_ROW[RED_PLAYER],
+    BP: BACK_ROW[BLACK_PLAYER],
+}
+
+# Ranks of the move classes, the history score is added to the quiet moves below KILLER_RANK.
+PV_RANK = 3 << 40
+CAPTURE_RANK = 2 << 40
+PROMOTION_RANK = 2 << 40
+KILLER_RANK = 1 << 40
+
+
+def is_promotion(move):
+    return PROMOTION_ROW.get(move.player_type) == move.target_loc[0]
+
+
+class MoveOrdering:
+    def __init__(self, killers_per_ply=2):
+        """Initialize empty ordering tables.
+
+        :param killers_per_ply: The number of killer moves kept for each ply.
+        """
+        self.killers_per_ply = killers_per_ply
+        # The best root move of the last completed iteration.
+        self.pv_move = None
+        # ply: list of the last quiet moves that caused a cutoff at that ply, the newest first.
+        self.killers = defaultdict(list)
+        # (tool, origin, target): the sum of depth ** 2 of the cutoffs the move caused.
+        self.history = defaultdict(int)
+
+    def new_search(self):
+        """Preparing the tables for the search of a new move.
+
+        The plies of the killers no longer match the new root, and the history is aged so recent cutoffs weigh more.
+        """
+        self.pv_move = None
+        self.killers.clear()
+        for key in self.history:
+            self.history[key] //= 2
+
+    def order_moves(self, moves, ply, hash_move=None):
+        """Sorting the moves of a node, the most promising first.
+
+        :param moves: The moves of the node, the list is not changed.
+        :param ply: The distance of the node from the root.
+        :param hash_move: The best move stored for this node in the transposition table, if any.
+        :return: A new list of the moves.
+        """
+        killers = self.killers.get(ply, ())
+        pv_move = self.pv_move if ply == 0 else None
+
+        def rank(move):
+            if move == pv_move or move == hash_move:
+                return PV_RANK
+            if move.jumped_locs:
+                return CAPTURE_RANK + len(move.jumped_locs)
+            if is_promotion(move):
+                return PROMOTION_RANK
+            if move in killers:
+                return KILLER_RANK + len(killers) - killers.index(move)
+            return self.history.get((move.player_type, move.origin_loc, move.target_loc), 0)
+
+        return sorted(moves, key=rank, reverse=True)
+
+    def record_cutoff(self, move, depth, ply):
+        """Updating the tables after the move caused a beta (or alpha) cutoff.
+
+        Captures and promotions are ranked first anyway, so only quiet moves are recorded.
+        """
+        if move.jumped_locs or is_promotion(move):
+            return
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killers_per_ply:]
+        self.history[(move.player_type, move.origin_loc, move.target_loc)] += max(depth, 1) ** 2
+
+    def add_history(self, history):
+        """Adding the history scores of another search of the same player (e.g. a ponder) to this one.
+
+        :param history: A dict of (tool, origin, target): score, as the history of this class.
+        """
+        for key, score in history.items():
+            self.history[key] += score
+
+    def record_pv(self, move):
+        """Keeping the best root move of a completed iteration, to search it first in the next one.
+        """
+        self.pv_move = move
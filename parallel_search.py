@@ -0,0 +1,116 @@
+"""Root-parallel MiniMax search on a pool of worker processes.
+
+The root moves are split between the workers, each searching the subtree of one root move with the full alpha-beta
+window, so the values are exact and the best root move is the same as in a single process search. Every worker
+process keeps its own player object (and its tables) for the whole game.
+"""
+import importlib
+import multiprocessing
+import time
+from utils import INFINITY, RootResult
+
+# The player of the current worker process, created by init_worker.
+_worker_player = None
+
+
+def init_worker(player_module, player_args, player_options):
+    """Creating the player of a worker process.
+
+    :param player_module: The name of the module of the player class, e.g. 'players.simple_player'.
+    :param player_args: The positional arguments of the player class.
+    :param player_options: The keyword arguments of the player class, without workers.
+    """
+    global _worker_player
+    _worker_player = importlib.import_module(player_module).Player(*player_args, **player_options)
+
+
+def search_root_move(task):
+    """Searching the subtree of a single root move in a worker process.
+
+    :param task: A tuple: (state, move, depth, maximizing_player, deadline). The deadline is a time.time() value.
+    :return: A tuple: (the minimax value, whether the search completed in time, the number of nodes,
+             the number of quiescence nodes, the deepest quiescence ply)
+    """
+    state, move, depth, maximizing_player, deadline = task
+    player = _worker_player
+    # The worker searches on its own CPU time, so the deadline is translated to a time budget of this task.
+    player.clock = player.timer()
+    player.time_for_current_move = deadline - time.time()
+
+    minimax = player.create_minimax()
+    state.perform_move(move)
+    value, _ = minimax.search(state, depth - 1, -INFINITY, INFINITY, not maximizing_player, 1)
+    return value, not player.no_more_time(), minimax.nodes, minimax.quiescence_nodes, minimax.max_quiescence_ply
+
+
+def create_search_pool(workers, player_module, player_args, player_options):
+    """Creating a pool of worker processes, each with its own player.
+    """
+    return multiprocessing.Pool(workers, init_worker, (player_module, player_args, player_options))
+
+
+class ParallelRootSearch:
+    def __init__(self, pool, my_color, no_more_time, time_left, move_ordering=None, quiescence_depth=0):
+        """Initialize a root-parallel search, with the same search method as MiniMaxWithAlphaBetaPruning.
+
+        :param pool: A pool created by create_search_pool.
+        :param my_color: The color of the player who runs this search.
+        :param no_more_time: A function that returns true if there is no more time to run this search.
+        :param time_left: A function that returns the remaining time of this search in seconds.
+        :param move_ordering: An optional move_ordering.MoveOrdering, to dispatch the most promising root moves first.
+        :param quiescence_depth: The quiescence depth of the workers, for the statistics only.
+        """
+        self.pool = pool
+        self.my_color = my_color
+        self.no_more_time = no_more_time
+        self.time_left = time_left
+        self.move_ordering = move_ordering
+        self.quiescence_depth = quiescence_depth
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.max_quiescence_ply = 0
+        # The best root move of the last search of a max root, see utils.RootResult.
+        self.root_result = RootResult(0)
+
+    def search(self, state, depth, alpha, beta, maximizing_player, ply=0):
+        """Searching the root moves in parallel.
+
+        The alpha and beta of the root are not passed to the workers, every root move is searched with the full
+        window, so that its value is exact.
+        :return: A tuple: (The minimax value, The best move in case of max node or None in min mode)
+        """
+        self.nodes += 1
+        next_moves = state.get_possible_moves()
+        if not next_moves:
+            # This player has no moves. So the previous player is the winner.
+            return INFINITY if state.curr_player != self.my_color else -INFINITY, None
+        if self.move_ordering is not None:
+            next_moves = self.move_ordering.order_moves(next_moves, 0)
+
+        deadline = time.time() + self.time_left()
+        results = self.pool.imap(search_root_move,
+                                 [(state, move, depth, maximizing_player, deadline) for move in next_moves])
+
+        selected_move = next_moves[0]
+        best_move_utility = -INFINITY if maximizing_player else INFINITY
+        self.root_result = RootResult(depth)
+        for move in next_moves:
+            try:
+                minimax_value, completed, nodes, quiescence_nodes, max_quiescence_ply = results.next(
+                    max(deadline - time.time(), 0))
+            except multiprocessing.TimeoutError:
+                break
+            self.nodes += nodes
+            self.quiescence_nodes += quiescence_nodes
+            self.max_quiescence_ply = max(self.max_quiescence_ply, max_quiescence_ply)
+            if not completed:
+                break
+            if maximizing_player:
+                self.root_result.publish(move, minimax_value)
+            if (minimax_value > best_move_utility if maximizing_player else minimax_value < best_move_utility):
+                best_move_utility = minimax_value
+                selected_move = move
+
+        if self.move_ordering is not None and not self.no_more_time():
+            self.move_ordering.record_pv(selected_move)
+        return best_move_utility, selected_move if maximizing_player else None
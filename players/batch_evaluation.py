@@ -0,0 +1,198 @@
+"""Batched leaf evaluation with NumPy: the criteria of players.evaluation1 for many positions at once.
+
+The boards are encoded as an (N, 32) int8 array, a column for every playable square in the order of
+checkers.bitboard.SQUARES, and every criterion is calculated for all the rows with array operations. The utilities
+are equal to the utility of players.evaluation1.Evaluation, position by position: the array operations are done in
+the same order as the scalar ones, so even the floats are the same.
+
+In this game the batches are too small to pay off. A batch has about 270us of fixed NumPy overhead, and a node at
+depth 1 has only about 10 children, so the search with the batch_evaluation option of
+utils.MiniMaxWithAlphaBetaPruning is about 2x slower than the scalar one ("run_bench.py batch 4 bitboard": 0.29s
+leaf by leaf, 0.70s batched). It is kept opt-in, and no player uses it.
+
+NumPy is optional, it is needed only when a BatchEvaluation is created.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils import INFINITY
+from checkers.consts import EM, RP, RK, BP, BK, RED_PLAYER, MAX_TURNS_NO_JUMP, BOARD_ROWS, BOARD_COLS, BACK_ROW
+from checkers.bitboard import SQUARES, SQUARE_INDEX
+from .evaluation1 import CriteriaEnum
+from .features import NEIGHBOUR_PAIRS, JUMP_PAIRS
+
+# The codes of the tools in the encoded boards. Turning a board around (reversing its squares) and negating its codes
+# swaps the roles of the players, so the criteria of black are calculated as the criteria of red on the turned board.
+TOOL_CODES = {EM: 0, RP: 1, RK: 2, BP: -1, BK: -2}
+
+# The index of an extra empty column, for the missing neighbours of the squares on the edges.
+NO_SQUARE = len(SQUARES)
+
+
+def square_indices(locs_of_square, width):
+    """An (32, width) index array of the given locations of every square, NO_SQUARE where a square has none.
+    """
+    indices = np.full((len(SQUARES), width), NO_SQUARE)
+    for s, loc in enumerate(SQUARES):
+        for i, other_loc in enumerate(locs_of_square.get(loc, ())):
+            indices[s, i] = SQUARE_INDEX[other_loc]
+    return indices
+
+
+if np is not None:
+    ROWS = np.array([r for r, c in SQUARES])
+    COLS = np.array([c for r, c in SQUARES])
+    EDGE_ROW_SQUARES = (ROWS == 0) | (ROWS == BOARD_ROWS - 1)
+    EDGE_COL_SQUARES = ((COLS == 0) | (COLS == BOARD_COLS - 1)) & ~EDGE_ROW_SQUARES
+    # The distance of every square from the throne of red, as in evaluation1.increase_close_to_throne_counter.
+    THRONE_DISTANCES = np.abs((BOARD_ROWS - 1) - BACK_ROW[RED_PLAYER] - ROWS)
+    # The squared Chebyshev distance between every two squares.
+    SQUARED_DISTANCES = np.maximum(np.abs(ROWS[:, None] - ROWS[None, :]), np.abs(COLS[:, None] - COLS[None, :])) ** 2
+
+    NEIGHBOURS_1 = square_indices({loc: [pair[0] for pair in pairs] for loc, pairs in NEIGHBOUR_PAIRS.items()}, 4)
+    NEIGHBOURS_2 = square_indices({loc: [pair[1] for pair in pairs] for loc, pairs in NEIGHBOUR_PAIRS.items()}, 4)
+    JUMPS_BEFORE = square_indices({loc: [pair[0] for pair in pairs]
+                                   for loc, pairs in JUMP_PAIRS[RED_PLAYER].items()}, 2)
+    JUMPS_AFTER = square_indices({loc: [pair[1] for pair in pairs]
+                                  for loc, pairs in JUMP_PAIRS[RED_PLAYER].items()}, 2)
+
+
+def red_criteria(boards):
+    """Calculating the criteria of red, as in evaluation1.Evaluation.calc_criteria.
+
+    :param boards: An (N, 33) array of encoded boards, with the NO_SQUARE column.
+    :return: A list of the criteria by CriteriaEnum, each an array of N numbers. The distance criterion is None.
+    """
+    pawns = boards == TOOL_CODES[RP]
+    kings = boards == TOOL_CODES[RK]
+    pieces = boards > 0
+    opponents = boards < 0
+    empty = boards == 0
+    opponent_pawns = boards == TOOL_CODES[BP]
+
+    # The same rules as features.protection_counts. The squares on the edges have only NO_SQUARE neighbours.
+    protected = (pieces[:, NEIGHBOURS_1] & pieces[:, NEIGHBOURS_2]).any(axis=2) & pieces[:, :NO_SQUARE]
+    can_be_taken = (((opponents[:, JUMPS_BEFORE] & empty[:, JUMPS_AFTER]) |
+                     ((boards == TOOL_CODES[BK])[:, JUMPS_AFTER] & empty[:, JUMPS_BEFORE])).any(axis=2) &
+                    pieces[:, :NO_SQUARE] & ~protected).sum(axis=1)
+
+    pawns = pawns[:, :NO_SQUARE]
+    criteria = [None] * CriteriaEnum.criteria_num
+    criteria[CriteriaEnum.PAWN_NUM] = pawns.sum(axis=1)
+    criteria[CriteriaEnum.KING_NUM] = kings.sum(axis=1)
+    criteria[CriteriaEnum.EDGE_ROWS] = (pawns & EDGE_ROW_SQUARES).sum(axis=1)
+    criteria[CriteriaEnum.EDGE_COLS] = (pawns & EDGE_COL_SQUARES).sum(axis=1)
+    criteria[CriteriaEnum.PROTECTED] = protected.sum(axis=1)
+    criteria[CriteriaEnum.CLOSE_TO_THRONE] = np.where(opponent_pawns.sum(axis=1) <= 1,
+                                                      (pawns * THRONE_DISTANCES).sum(axis=1), 0)
+    criteria[CriteriaEnum.CAN_BE_TAKEN] = np.where(can_be_taken < 2, 0, can_be_taken)
+    return criteria
+
+
+def red_distances(boards, my_criteria, oppo_criteria):
+    """The distance criterion of red, as in evaluation1.Evaluation.calc_distances.
+
+    :param boards: An (N, 33) array of encoded boards.
+    """
+    kings = (boards[:, :NO_SQUARE] == TOOL_CODES[RK]).astype(np.int64)
+    pieces = (boards[:, :NO_SQUARE] > 0).astype(np.int64)
+    sum_d = np.sqrt(np.einsum('nk,kp,np->n', kings, SQUARED_DISTANCES, pieces))
+    m_k_num = my_criteria[CriteriaEnum.KING_NUM]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sum_d = sum_d / (m_k_num * BOARD_ROWS)
+    sum_d = np.where(m_k_num - oppo_criteria[CriteriaEnum.KING_NUM] < 0, sum_d, 1 - sum_d)
+    return np.where(m_k_num < 1, 0.0, sum_d)
+
+
+class BatchEvaluation:
+    def __init__(self, my_color, weights=(100.0, 150.0, 1.0, 1.0),
+                 loc_eval_weights=(15.0, 30.0, 5.0, 3.0, 3.0, 1.0, -10.0)):
+        """
+        :param weights: The weights of evaluation1.Evaluation.utility.
+        :param loc_eval_weights: The loc_eval_weights of evaluation1.Evaluation.utility.
+        """
+        if np is None:
+            raise ImportError('BatchEvaluation requires numpy')
+        self.color = my_color
+        self.weights = weights
+        self.loc_eval_weights = loc_eval_weights
+
+    def encode(self, state):
+        board = state.board
+        return [TOOL_CODES[board[loc]] for loc in SQUARES]
+
+    def leaf(self, state):
+        """Preparing a state for a batch.
+
+        :return: A tuple: (the utility of the state if it is known without evaluation, else None,
+                           the encoded board of the state if it must be evaluated, else None)
+        """
+        if not state.has_any_move():
+            return (INFINITY if state.curr_player != self.color else -INFINITY), None
+        if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
+            return 0, None
+        return None, self.encode(state)
+
+    def utilities(self, leaves):
+        """Evaluating a batch of states, prepared by leaf.
+
+        :return: A list of the utilities of the states.
+        """
+        boards = [board for value, board in leaves if board is not None]
+        values = iter(self.evaluate_boards(np.array(boards, dtype=np.int8)).tolist() if boards else ())
+        return [next(values) if board is not None else value for value, board in leaves]
+
+    def utility(self, state):
+        return self.utilities([self.leaf(state)])[0]
+
+    def loc_evaluation(self, criteria):
+        """One side of evaluation1.Evaluation.loc_evaluation, without the pawns term.
+
+        :return: A tuple: (the evaluation so far, the number of pawns not counted by other criteria)
+        """
+        weights = self.loc_eval_weights
+        eval = 0 + (weights[CriteriaEnum.KING_NUM] * criteria[CriteriaEnum.KING_NUM])
+        p_num = criteria[CriteriaEnum.PAWN_NUM]
+        for criterion in (CriteriaEnum.CLOSE_TO_THRONE, CriteriaEnum.EDGE_ROWS, CriteriaEnum.EDGE_COLS,
+                          CriteriaEnum.PROTECTED, CriteriaEnum.CAN_BE_TAKEN):
+            eval = eval + (weights[criterion] * criteria[criterion])
+            p_num = p_num - criteria[criterion]
+        return eval, p_num
+
+    def evaluate_boards(self, boards):
+        """Calculating the utilities of a batch of encoded boards, of states that are not terminal.
+
+        :param boards: An (N, 32) int8 array.
+        :return: An array of the N utilities.
+        """
+        weights = self.loc_eval_weights
+        epsilon = 0.0000001
+        n = len(boards)
+        turned = -boards[:, ::-1]
+        my_boards, oppo_boards = (boards, turned) if self.color == RED_PLAYER else (turned, boards)
+        # Both players in one pass, each as red.
+        both_boards = np.concatenate([my_boards, oppo_boards])
+        criteria = red_criteria(np.concatenate([both_boards, np.zeros((2 * n, 1), dtype=np.int8)], axis=1))
+        my_criteria = [None if c is None else c[:n] for c in criteria]
+        oppo_criteria = [None if c is None else c[n:] for c in criteria]
+        distances = red_distances(my_boards, my_criteria, oppo_criteria)
+
+        my_eval, m_p_num = self.loc_evaluation(my_criteria)
+        my_eval += (weights[CriteriaEnum.PAWN_NUM] * m_p_num)
+        m_p_count = my_criteria[CriteriaEnum.PAWN_NUM] + my_criteria[CriteriaEnum.KING_NUM]
+        my_eval /= np.where(m_p_count != 0, m_p_count, epsilon)
+
+        oppo_eval, _ = self.loc_evaluation(oppo_criteria)
+        # As in the scalar evaluation, the pawns term of the opponent is by the pawns number of this player.
+        oppo_eval += (weights[CriteriaEnum.PAWN_NUM] * m_p_num)
+        o_p_count = oppo_criteria[CriteriaEnum.PAWN_NUM] + oppo_criteria[CriteriaEnum.KING_NUM]
+        oppo_eval /= np.where(o_p_count != 0, o_p_count, epsilon)
+
+        utility = (my_eval - oppo_eval) * self.weights[3]
+        utility += (self.weights[2] * distances)
+        for i in range(len(self.weights) - 1):
+            utility += (self.weights[i] * (my_criteria[i] - oppo_criteria[i]))
+        utility = np.where(o_p_count == 0, INFINITY, utility)
+        return np.where(m_p_count == 0, -INFINITY, utility)
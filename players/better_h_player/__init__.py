@@ -10,9 +10,20 @@ from ..evaluation import Evaluation
 # ===============================================================================
 
 class Player(simple_player.Player):
-    def __init__(self, setup_time, player_color, time_per_k_turns, k):
-        simple_player.Player.__init__(self, setup_time, player_color, time_per_k_turns, k)
+    def __init__(self, setup_time, player_color, time_per_k_turns, k, incremental_eval=False, verify_eval=False,
+                 **options):
+        """
+        :param incremental_eval: Whether the evaluation reads the terms the game state keeps incrementally.
+        :param verify_eval: Whether the evaluation checks its incremental terms against a full rescan, for debug.
+        """
+        simple_player.Player.__init__(self, setup_time, player_color, time_per_k_turns, k,
+                                      evaluation_options={'incremental_eval': incremental_eval,
+                                                          'verify_eval': verify_eval},
+                                      **options)
+        self.evaluation = Evaluation(self.color, incremental_eval, verify_eval)
 
     def utility(self, state):
-        eval = Evaluation(self.color)
-        return eval.utility(state)
+        return self.evaluation.utility(state)
+
+    def evaluation_weights(self):
+        return self.evaluation.weights
@@ -1,6 +1,7 @@
-from collections import defaultdict
 from checkers.consts import EM, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP, MY_COLORS, BACK_ROW, \
     RED_PLAYER, BOARD_ROWS, BOARD_COLS
+from checkers import eval_terms
+from .features import protection_counts
 from utils import INFINITY
 import math
 
@@ -25,9 +26,18 @@ class EvalsEnum:
 
 
 class Evaluation:
-    def __init__(self, my_color):
+    def __init__(self, my_color, incremental=False, verify=False, weights=(1.0, 1.0, 1.0)):
+        """
+        :param weights: The weights of the evaluations by EvalsEnum, used by utility unless it is given others.
+        :param incremental: Whether to read the piece counts and the edge and throne terms from the eval_terms the
+                            state keeps incrementally, instead of rescanning the board for them.
+        :param verify: Whether to evaluate every state both ways and check that the evaluations are equal.
+        """
         self.color = my_color
         self.oppo_color = OPPONENT_COLOR[self.color]
+        self.incremental = incremental
+        self.verify = verify
+        self.weights = weights
 
         self.my_evals = []
         self.oppo_evals = []
@@ -105,16 +115,23 @@ class Evaluation:
         r, c = 0, 1
         if piece_loc[r] > 0 and piece_loc[r] < BOARD_ROWS - 1 and piece_loc[c] > 0 and piece_loc[c] < BOARD_COLS - 1:
             for i in range(len(loc_before)):
-                if loc_before[i] != EM and not self.of_same_player([piece_val, state.board[loc_before[i]]]):
-                    if loc_after[i] == EM:
+                if state.board[loc_before[i]] != EM and not self.of_same_player(
+                        [piece_val, state.board[loc_before[i]]]):
+                    if state.board[loc_after[i]] == EM:
                         return True
             for i in range(len(loc_after)):
                 if self.is_king(state.board[loc_after[i]]) and not self.of_same_player(
                         [piece_val, state.board[loc_after[i]]]):
-                    if loc_before[i] == EM:
+                    if state.board[loc_before[i]] == EM:
                         return True
         return False
 
+    # The protected and can be taken values of the pieces of the given color, see is_protected and is_can_be_taken.
+    def protection_evaluation(self, state, piece_locs, clr):
+        protected, can_be_taken = protection_counts(
+            state.board, piece_locs[PAWN_COLOR[clr]] + piece_locs[KING_COLOR[clr]], clr)
+        return (CriteriaEval.PROTECTED * protected) + (CriteriaEval.CAN_BE_TAKEN * can_be_taken)
+
     def pieces_evaluation(self, piece_locs, weights=(1.0, 1.5)):
         self.my_evals[EvalsEnum.PIECES] = (weights[0] * len(piece_locs[PAWN_COLOR[self.color]])) + (
                 weights[1] * len(piece_locs[KING_COLOR[self.color]]))
@@ -133,11 +150,7 @@ class Evaluation:
                     eval += CriteriaEval.EDGE_ROWS
                 elif self.is_in_edge_cols(c):
                     eval += CriteriaEval.EDGE_COLS
-                if self.is_protected(state, PAWN_COLOR[self.oppo_color], (r, c)):
-                    eval += CriteriaEval.PROTECTED
-                elif self.is_can_be_taken(state, PAWN_COLOR[self.oppo_color], (r, c)):
-                    eval += CriteriaEval.CAN_BE_TAKEN
-            return eval
+            return eval + self.protection_evaluation(state, piece_locs, clr)
 
         my_eval = (CriteriaEval.KING * len(piece_locs[KING_COLOR[self.color]])) + (CriteriaEval.PAWN * len(piece_locs[PAWN_COLOR[self.color]])) + iterate_eval(self.color)
         oppo_eval = (CriteriaEval.KING * len(piece_locs[KING_COLOR[self.oppo_color]])) + (CriteriaEval.PAWN * len(piece_locs[PAWN_COLOR[self.oppo_color]])) + iterate_eval(self.oppo_color)
@@ -146,22 +159,75 @@ class Evaluation:
         self.my_evals[EvalsEnum.LOCS] = my_eval / (m_p_count if m_p_count else epsilon)
         self.oppo_evals[EvalsEnum.LOCS] = oppo_eval / (o_p_count if o_p_count else epsilon)
 
+    # The same as pieces_evaluation, by the piece counts of the state eval_terms.
+    def pieces_evaluation_incremental(self, state, weights=(1.0, 1.5)):
+        terms = state.eval_terms
+        self.my_evals[EvalsEnum.PIECES] = (
+                (weights[0] * eval_terms.get_term(terms, PAWN_COLOR[self.color], eval_terms.COUNT)) +
+                (weights[1] * eval_terms.get_term(terms, KING_COLOR[self.color], eval_terms.COUNT)))
+        self.oppo_evals[EvalsEnum.PIECES] = (
+                (weights[0] * eval_terms.get_term(terms, PAWN_COLOR[self.oppo_color], eval_terms.COUNT)) +
+                (weights[1] * eval_terms.get_term(terms, KING_COLOR[self.oppo_color], eval_terms.COUNT)))
+
+    # The same as loc_evaluation, by the state eval_terms. Only the protection terms are calculated per piece.
+    def loc_evaluation_incremental(self, state, piece_locs):
+        epsilon = 0.0000001
+        terms = state.eval_terms
+
+        def iterate_eval(clr):
+            pawn, king = PAWN_COLOR[clr], KING_COLOR[clr]
+            eval = 0.0
+            edge_tools = (pawn, king)
+            if eval_terms.get_term(terms, PAWN_COLOR[OPPONENT_COLOR[clr]], eval_terms.COUNT) <= 1:
+                # The pawns are evaluated by their progress to the throne, instead of the edges.
+                eval += eval_terms.edge_row_distance_sum(terms, pawn, (BOARD_ROWS - 1) - BACK_ROW[self.color])
+                eval -= CriteriaEval.PAWN * eval_terms.get_term(terms, pawn, eval_terms.COUNT)
+                edge_tools = (king,)
+            for tool in edge_tools:
+                eval += CriteriaEval.EDGE_ROWS * eval_terms.get_term(terms, tool, eval_terms.EDGE_ROWS)
+                eval += CriteriaEval.EDGE_COLS * eval_terms.get_term(terms, tool, eval_terms.EDGE_COLS)
+            return eval + self.protection_evaluation(state, piece_locs, clr)
+
+        m_k_num = eval_terms.get_term(terms, KING_COLOR[self.color], eval_terms.COUNT)
+        m_p_num = eval_terms.get_term(terms, PAWN_COLOR[self.color], eval_terms.COUNT)
+        o_k_num = eval_terms.get_term(terms, KING_COLOR[self.oppo_color], eval_terms.COUNT)
+        o_p_num = eval_terms.get_term(terms, PAWN_COLOR[self.oppo_color], eval_terms.COUNT)
+        my_eval = (CriteriaEval.KING * m_k_num) + (CriteriaEval.PAWN * m_p_num) + iterate_eval(self.color)
+        oppo_eval = (CriteriaEval.KING * o_k_num) + (CriteriaEval.PAWN * o_p_num) + iterate_eval(self.oppo_color)
+        m_p_count = m_p_num + m_k_num
+        o_p_count = o_p_num + o_k_num
+        self.my_evals[EvalsEnum.LOCS] = my_eval / (m_p_count if m_p_count else epsilon)
+        self.oppo_evals[EvalsEnum.LOCS] = oppo_eval / (o_p_count if o_p_count else epsilon)
+
     def run_evals(self, state, weights=None):
+        if self.verify:
+            self.calc_evals(state, weights, False)
+            full_evals = (self.my_evals, self.oppo_evals)
+            self.calc_evals(state, weights, True)
+            assert (self.my_evals, self.oppo_evals) == full_evals, \
+                'incremental evals {} != full evals {}'.format((self.my_evals, self.oppo_evals), full_evals)
+        else:
+            self.calc_evals(state, weights, self.incremental)
+
+    def calc_evals(self, state, weights, incremental):
         self.my_evals = [0] * EvalsEnum.evals_num
         self.oppo_evals = [0] * EvalsEnum.evals_num
 
-        piece_locs = defaultdict(lambda: [])
-        for loc, val in state.board.items():
-            if val != EM:
-                piece_locs[val].append(loc)
+        piece_locs = state.piece_locs()
 
-        self.pieces_evaluation(piece_locs, weights) if weights else self.pieces_evaluation(piece_locs)
-        self.loc_evaluation(state, piece_locs)
+        if incremental:
+            self.pieces_evaluation_incremental(state, weights) if weights else \
+                self.pieces_evaluation_incremental(state)
+            self.loc_evaluation_incremental(state, piece_locs)
+        else:
+            self.pieces_evaluation(piece_locs, weights) if weights else self.pieces_evaluation(piece_locs)
+            self.loc_evaluation(state, piece_locs)
         self.calc_distances(piece_locs)
 
-    def utility(self, state, weights=(1.0, 1.0, 1.0)):
+    def utility(self, state, weights=None):
+        weights = weights or self.weights
 
-        if len(state.get_possible_moves()) == 0:
+        if not state.has_any_move():
             return INFINITY if state.curr_player != self.color else -INFINITY
         if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
             return 0
@@ -1,6 +1,7 @@
-from collections import defaultdict
 import math
 from utils import INFINITY
+from checkers import eval_terms
+from .features import protection_counts
 from checkers.consts import EM, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP, BOARD_ROWS, BOARD_COLS, \
     RED_PLAYER, MY_COLORS, BACK_ROW
 
@@ -19,8 +20,15 @@ class CriteriaEnum:
 
 
 class Evaluation:
-    def __init__(self, my_color):
+    def __init__(self, my_color, incremental=False, verify=False):
+        """
+        :param incremental: Whether to read the piece counts and the edge and throne criteria from the eval_terms
+                            the state keeps incrementally, instead of rescanning the board for them.
+        :param verify: Whether to calculate the criteria of every state both ways and check that they are equal.
+        """
         self.color = my_color
+        self.incremental = incremental
+        self.verify = verify
 
         self.my_criteria = []
         self.oppo_criteria = []
@@ -99,13 +107,14 @@ class Evaluation:
         r, c = 0, 1
         if piece_loc[r] > 0 and piece_loc[r] < BOARD_ROWS - 1 and piece_loc[c] > 0 and piece_loc[c] < BOARD_COLS - 1:
             for i in range(len(loc_before)):
-                if loc_before[i] != EM and not self.of_same_player([piece_val, state.board[loc_before[i]]]):
-                    if loc_after[i] == EM:
+                if state.board[loc_before[i]] != EM and not self.of_same_player(
+                        [piece_val, state.board[loc_before[i]]]):
+                    if state.board[loc_after[i]] == EM:
                         return True
             for i in range(len(loc_after)):
                 if self.is_king(state.board[loc_after[i]]) and not self.of_same_player(
                         [piece_val, state.board[loc_after[i]]]):
-                    if loc_before[i] == EM:
+                    if state.board[loc_before[i]] == EM:
                         return True
 
         return False
@@ -172,18 +181,13 @@ class Evaluation:
             elif loc[c] == 0 or loc[c] == BOARD_COLS - 1:
                 self.oppo_criteria[CriteriaEnum.EDGE_COLS] += 1
 
-    # Increasing the relevant protected counter according to the color of the given piece.
-    def increase_protected_counter(self, piece_val):
-        if self.is_my_piece(piece_val):
-            self.my_criteria[CriteriaEnum.PROTECTED] += 1
-        else:  # is oppo piece.
-            self.oppo_criteria[CriteriaEnum.PROTECTED] += 1
-
-    def increase_can_be_taken_counter(self, piece_val):
-        if self.is_my_piece(piece_val):
-            self.my_criteria[CriteriaEnum.CAN_BE_TAKEN] += 1
-        else:  # is oppo piece
-            self.oppo_criteria[CriteriaEnum.CAN_BE_TAKEN] += 1
+    # Increasing the protected and can be taken counters of both players, see is_protected and is_can_be_taken.
+    def increase_protection_counters(self, state, piece_locs):
+        for criteria, color in ((self.my_criteria, self.color), (self.oppo_criteria, OPPONENT_COLOR[self.color])):
+            protected, can_be_taken = protection_counts(
+                state.board, piece_locs[PAWN_COLOR[color]] + piece_locs[KING_COLOR[color]], color)
+            criteria[CriteriaEnum.PROTECTED] += protected
+            criteria[CriteriaEnum.CAN_BE_TAKEN] += can_be_taken
 
     def increase_close_to_throne_counter(self, piece_locs):
         opponent_color = OPPONENT_COLOR[self.color]
@@ -196,34 +200,55 @@ class Evaluation:
             [abs((BOARD_ROWS - 1) - BACK_ROW[opponent_color] - loc[r]) for loc in piece_locs[PAWN_COLOR[opponent_color]]
              if len(piece_locs[PAWN_COLOR[self.color]]) <= 1])
 
+    # The same as increase_pieces_counter, increase_edge_counters and increase_close_to_throne_counter together,
+    # by the state eval_terms.
+    def increase_incremental_counters(self, state):
+        terms = state.eval_terms
+        for criteria, color in ((self.my_criteria, self.color), (self.oppo_criteria, OPPONENT_COLOR[self.color])):
+            pawn = PAWN_COLOR[color]
+            criteria[CriteriaEnum.PAWN_NUM] += eval_terms.get_term(terms, pawn, eval_terms.COUNT)
+            criteria[CriteriaEnum.KING_NUM] += eval_terms.get_term(terms, KING_COLOR[color], eval_terms.COUNT)
+            criteria[CriteriaEnum.EDGE_ROWS] += eval_terms.get_term(terms, pawn, eval_terms.EDGE_ROWS)
+            criteria[CriteriaEnum.EDGE_COLS] += eval_terms.get_term(terms, pawn, eval_terms.EDGE_COLS)
+            if eval_terms.get_term(terms, PAWN_COLOR[OPPONENT_COLOR[color]], eval_terms.COUNT) <= 1:
+                criteria[CriteriaEnum.CLOSE_TO_THRONE] += eval_terms.edge_row_distance_sum(
+                    terms, pawn, (BOARD_ROWS - 1) - BACK_ROW[color])
+
     def get_criteria(self, state):
+        if self.verify:
+            self.calc_criteria(state, False)
+            full_criteria = (self.my_criteria, self.oppo_criteria)
+            self.calc_criteria(state, True)
+            assert (self.my_criteria, self.oppo_criteria) == full_criteria, \
+                'incremental criteria {} != full criteria {}'.format((self.my_criteria, self.oppo_criteria),
+                                                                     full_criteria)
+        else:
+            self.calc_criteria(state, self.incremental)
+
+    def calc_criteria(self, state, incremental):
         self.my_criteria = [0] * CriteriaEnum.criteria_num
         self.oppo_criteria = [0] * CriteriaEnum.criteria_num
         # opponent_color = OPPONENT_COLOR[self.color]
 
-        piece_locs = defaultdict(lambda: [])
-        for loc, val in state.board.items():
-            if val != EM:
-                piece_locs[val].append(loc)
-
-                if self.is_protected(state, val, loc):
-                    self.increase_protected_counter(val)
-                elif self.is_can_be_taken(state, val, loc):
-                    self.increase_can_be_taken_counter(val)
+        piece_locs = state.piece_locs()
+        self.increase_protection_counters(state, piece_locs)
 
         if self.my_criteria[CriteriaEnum.CAN_BE_TAKEN] < 2:
             self.my_criteria[CriteriaEnum.CAN_BE_TAKEN] = 0
         if self.oppo_criteria[CriteriaEnum.CAN_BE_TAKEN] < 2:
             self.oppo_criteria[CriteriaEnum.CAN_BE_TAKEN] = 0
 
-        self.increase_pieces_counter(piece_locs)
-        self.increase_edge_counters(piece_locs)
-        self.increase_close_to_throne_counter(piece_locs)
+        if incremental:
+            self.increase_incremental_counters(state)
+        else:
+            self.increase_pieces_counter(piece_locs)
+            self.increase_edge_counters(piece_locs)
+            self.increase_close_to_throne_counter(piece_locs)
         self.calc_distances(piece_locs)
 
     def utility(self, state, weights=(100.0, 150.0, 1.0, 1.0), loc_eval_weights=(15.0, 30.0, 5.0, 3.0, 3.0, 1.0, -10.0)):
 
-        if len(state.get_possible_moves()) == 0:
+        if not state.has_any_move():
             return INFINITY if state.curr_player != self.color else -INFINITY
         if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
             return 0
@@ -0,0 +1,81 @@
+"""Feature extraction shared by the evaluations: protection and capture threats of the pieces.
+
+The diagonal neighbours and the jump squares of every playable location are calculated once, at import, instead of
+building the neighbour lists for every piece at every leaf.
+"""
+from checkers.consts import EM, RED_PLAYER, BLACK_PLAYER, BOARD_ROWS, BOARD_COLS, IS_BLACK_TILE, MY_COLORS, \
+    OPPONENT_COLORS, OPPONENT_COLOR, KING_COLOR
+
+
+def is_inner_loc(loc):
+    # Pieces on the edges of the board are neither protected nor can be taken.
+    return 0 < loc[0] < BOARD_ROWS - 1 and 0 < loc[1] < BOARD_COLS - 1
+
+
+def locs_before(player, loc):
+    """The two diagonal locations ahead of a piece of the player, from which an opponent pawn can jump it.
+    """
+    r, c = loc
+    if player == RED_PLAYER:
+        return [(r + 1, c + 1), (r + 1, c - 1)]
+    return [(r - 1, c - 1), (r - 1, c + 1)]
+
+
+def locs_after(player, loc):
+    """The two diagonal locations behind a piece of the player, opposite to the locations in locs_before.
+    """
+    r, c = loc
+    if player == RED_PLAYER:
+        return [(r - 1, c - 1), (r - 1, c + 1)]
+    return [(r + 1, c + 1), (r + 1, c - 1)]
+
+
+INNER_LOCS = [(i, j)
+              for i in range(BOARD_ROWS)
+              for j in range(BOARD_COLS)
+              if IS_BLACK_TILE((i, j)) and is_inner_loc((i, j))]
+
+# location: the pairs of adjacent locations of the four diagonal neighbours, going around the location.
+NEIGHBOUR_PAIRS = {}
+for _loc in INNER_LOCS:
+    _around = locs_before(RED_PLAYER, _loc) + locs_after(RED_PLAYER, _loc)
+    NEIGHBOUR_PAIRS[_loc] = tuple((_around[i], _around[(i + 1) % 4]) for i in range(4))
+
+# player: {location: the (before, after) pairs of the jumps over a piece of the player at the location}.
+# An opponent piece at before can jump to after, and an opponent king at after can jump to before.
+JUMP_PAIRS = {player: {loc: tuple(zip(locs_before(player, loc), locs_after(player, loc))) for loc in INNER_LOCS}
+              for player in (RED_PLAYER, BLACK_PLAYER)}
+
+
+def protection_counts(board, locs, player):
+    """Counting the protected pieces, and the pieces that can be taken this turn, in one pass over the pieces.
+
+    A piece is protected if two adjacent diagonal neighbours of it are pieces of the same player. A piece that is
+    not protected can be taken if an opponent piece is diagonally ahead of it and the square behind is empty, or an
+    opponent king is diagonally behind it and the square ahead is empty.
+    :param board: A dict of location: tool, as in checkers.board.GameState.board.
+    :param locs: The locations of the pieces.
+    :param player: The player the pieces are counted as pieces of.
+    :return: A tuple: (the number of protected pieces, the number of pieces that can be taken)
+    """
+    own = MY_COLORS[player]
+    opponents = OPPONENT_COLORS[player]
+    opponent_king = KING_COLOR[OPPONENT_COLOR[player]]
+    jump_pairs = JUMP_PAIRS[player]
+    protected = can_be_taken = 0
+    for loc in locs:
+        pairs = NEIGHBOUR_PAIRS.get(loc)
+        if pairs is None:
+            continue
+        for loc_1, loc_2 in pairs:
+            if board[loc_1] in own and board[loc_2] in own:
+                protected += 1
+                break
+        else:
+            for before, after in jump_pairs[loc]:
+                before_val = board[before]
+                after_val = board[after]
+                if (before_val in opponents and after_val == EM) or (after_val == opponent_king and before_val == EM):
+                    can_be_taken += 1
+                    break
+    return protected, can_be_taken
@@ -5,9 +5,15 @@
 
 import abstract
 from utils import MiniMaxWithAlphaBetaPruning, INFINITY, run_with_limited_time, ExceededTimeError
-from checkers.consts import EM, PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
+from transposition import TranspositionTable
+from move_ordering import MoveOrdering
+from eval_cache import EvaluationCache
+from parallel_search import ParallelRootSearch, create_search_pool
+from pondering import Ponderer
+from checkers.consts import PAWN_COLOR, KING_COLOR, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
 import time
-from collections import defaultdict
+import copy
+import threading
 
 #===============================================================================
 # Globals
@@ -16,14 +22,53 @@ from collections import defaultdict
 PAWN_WEIGHT = 1
 KING_WEIGHT = 1.5
 
+# The deepest iteration of a player limited by a fixed number of nodes. Beyond it the transposition table may answer
+# an iteration without visiting new nodes, so the node budget would never run out.
+MAX_FIXED_NODES_DEPTH = 64
+
 #===============================================================================
 # Player
 #===============================================================================
 
 class Player(abstract.AbstractPlayer):
-    def __init__(self, setup_time, player_color, time_per_k_turns, k):
+    # The default maximal number of capture plies searched beyond the depth limit, 0 for no quiescence search.
+    QUIESCENCE_DEPTH = 0
+
+    def __init__(self, setup_time, player_color, time_per_k_turns, k, tt_size_mb=0, move_ordering=True,
+                 quiescence_depth=None, workers=0, ponder=False, eval_cache_entries=0, evaluation_options=None,
+                 fixed_depth=0, fixed_nodes=0):
+        """Player initialization.
+
+        :param tt_size_mb: The memory budget in megabytes of a transposition table kept between the moves of
+                           this player, or 0 to search without one.
+        :param move_ordering: Whether to order the searched moves by the PV move, killer moves and history heuristic.
+        :param quiescence_depth: The maximal number of capture plies searched beyond the depth limit. Defaults to
+                                 QUIESCENCE_DEPTH of the player class.
+        :param workers: The number of worker processes searching the root moves in parallel, or 0 (or 1) to search
+                        in this process. The worker processes do not count in the process time of this one, so a
+                        parallel player measures its time by the wall clock instead.
+        :param ponder: Whether to search on the opponent's time, in a separate process, the position after the
+                       predicted reply of the opponent.
+        :param eval_cache_entries: The maximal number of leaf evaluations cached between the searches of this
+                                   player, or 0 to evaluate without a cache.
+        :param evaluation_options: The options of the evaluation of a subclass, as a dict of its keyword arguments,
+                                   passed on to the players of the worker and ponder processes.
+        :param fixed_depth: The depth of every search, instead of the clock, or 0 for a search limited by time.
+        :param fixed_nodes: The number of nodes of every search, instead of the clock, or 0 for a search limited by
+                            time. With fixed_depth too, the search stops at whichever comes first.
+                            A player with either of them is deterministic: it chooses the same moves in every run and
+                            on every machine, so it neither ponders nor searches in parallel. The game runners do not
+                            time its moves, see run_game.GameRunner, so its searches take as long as they need.
+        """
         abstract.AbstractPlayer.__init__(self, setup_time, player_color, time_per_k_turns, k)
-        self.clock = time.process_time()
+        self.fixed_depth = fixed_depth
+        self.fixed_nodes = fixed_nodes
+        self.deterministic = bool(fixed_depth or fixed_nodes)
+        if self.deterministic:
+            workers = 0
+            ponder = False
+        self.timer = time.perf_counter if workers > 1 else time.process_time
+        self.clock = self.timer()
 
         # We are simply providing (remaining time / remaining turns) for each turn in round.
         # Taking a spare time of 0.05 seconds.
@@ -31,10 +76,133 @@ class Player(abstract.AbstractPlayer):
         self.time_remaining_in_round = self.time_per_k_turns
         self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
 
+        # Set by run_with_limited_time when a search iteration exceeded its time, so the search stops at once.
+        self.search_cancelled = threading.Event()
+        self.transposition_table = TranspositionTable(tt_size_mb) if tt_size_mb else None
+        self.move_ordering = MoveOrdering() if move_ordering else None
+        self.quiescence_depth = self.QUIESCENCE_DEPTH if quiescence_depth is None else quiescence_depth
+        self.evaluation_cache = EvaluationCache(eval_cache_entries) if eval_cache_entries else None
+
+        # The worker and ponder processes search with a player of this class, with the same search options.
+        player_args = (setup_time, player_color, time_per_k_turns, k)
+        search_options = {'tt_size_mb': tt_size_mb, 'move_ordering': move_ordering,
+                          'quiescence_depth': quiescence_depth, 'eval_cache_entries': eval_cache_entries}
+        search_options.update(evaluation_options or {})
+        self.search_pool = None
+        if workers > 1:
+            self.search_pool = create_search_pool(workers, type(self).__module__, player_args, search_options)
+        self.ponderer = Ponderer(type(self).__module__, player_args, search_options) if ponder else None
+
+    def create_minimax(self, no_more_time=None):
+        """Creating the MiniMax search of a single move, with the tables this player keeps between moves.
+
+        :param no_more_time: The time limit function of the search, defaults to the no_more_time of this player.
+                             The search also stops when search_cancelled is set.
+        """
+        time_limit = no_more_time or self.no_more_time
+        cancelled = self.search_cancelled.is_set
+
+        def no_more_time():
+            return cancelled() or time_limit()
+
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+        if self.move_ordering is not None:
+            self.move_ordering.new_search()
+        utility = self.utility
+        if self.evaluation_cache is not None:
+            self.evaluation_cache.set_weights(self.evaluation_weights())
+            utility = self.cached_utility
+        if self.search_pool is not None:
+            return ParallelRootSearch(self.search_pool, self.color, no_more_time, self.time_left,
+                                      move_ordering=self.move_ordering, quiescence_depth=self.quiescence_depth)
+        self.minimax = MiniMaxWithAlphaBetaPruning(utility, self.color, no_more_time,
+                                                   self.selective_deepening_criterion, in_place=True,
+                                                   transposition_table=self.transposition_table,
+                                                   move_ordering=self.move_ordering,
+                                                   quiescence_depth=self.quiescence_depth)
+        return self.minimax
+
+    def search_iteration(self, minimax, game_state, depth):
+        """Running an iteration of the iterative deepening, limited by the time of the move.
+
+        A deterministic player searches in this thread with no time limit, its search stops only on fixed_nodes.
+        :return: A tuple: (the (alpha, move) of the search, its run time)
+        :raise ExceededTimeError: When the time of the move ran out.
+        """
+        if self.deterministic:
+            return minimax.search(game_state, depth, -INFINITY, INFINITY, True), 0
+        return run_with_limited_time(
+            minimax.search, (game_state, depth, -INFINITY, INFINITY, True), {},
+            self.time_for_current_move - (self.timer() - self.clock), self.search_cancelled)
+
+    def search_done(self, depth):
+        """Whether a deterministic player ends its iterative deepening after completing the given depth.
+        """
+        return self.deterministic and depth >= (self.fixed_depth or MAX_FIXED_NODES_DEPTH)
+
+    def report_search(self, minimax):
+        """Printing the statistics of the search of the last move.
+        """
+        if minimax.quiescence_depth:
+            print('quiescence: {} of {} nodes, max extension ply {}'.format(
+                minimax.quiescence_nodes, minimax.nodes, minimax.max_quiescence_ply))
+        if self.transposition_table is not None:
+            print(self.transposition_table)
+        if self.evaluation_cache is not None:
+            print(self.evaluation_cache)
+
+    def best_so_far(self, minimax, best_move):
+        """Choosing the move after an iteration ran out of time.
+
+        :param best_move: The best move of the last completed iteration.
+        :return: The best move so far of the unfinished iteration if it is proven better (see utils.RootResult),
+                 or best_move.
+        """
+        result = minimax.root_result
+        if not result.improves(best_move):
+            return best_move
+        print('unfinished depth {} improved the move to {}, after {} root moves'.format(
+            result.depth, result.move, result.completed_moves))
+        return result.move
+
+    def stop_pondering(self, game_state, possible_moves):
+        """Stopping the ponder of the last opponent turn, if any.
+
+        On a ponder hit, the transposition table entries and the history scores of the ponder are added to the tables
+        of this player, so the search of the move continues the ponder's.
+        :return: A tuple: (the depth of the deepest pondered iteration, its best move) if the opponent played the
+                 predicted reply and an iteration was completed, or None.
+        """
+        if self.ponderer is None:
+            return None
+        result = self.ponderer.stop(game_state)
+        print(self.ponderer)
+        if result is None:
+            return None
+        if self.transposition_table is not None:
+            self.transposition_table.import_entries(result['tt_entries'])
+        if self.move_ordering is not None:
+            self.move_ordering.add_history(result['history'])
+        if result['move'] not in possible_moves:
+            return None
+        return result['depth'], possible_moves[possible_moves.index(result['move'])]
+
+    def start_pondering(self, game_state, move):
+        """Pondering the state after our move, on the opponent's time.
+        """
+        if self.ponderer is None:
+            return
+        next_state = copy.deepcopy(game_state)
+        next_state.perform_move(move)
+        self.ponderer.start(next_state)
+
     def get_move(self, game_state, possible_moves):
-        self.clock = time.process_time()
+        self.clock = self.timer()
         self.time_for_current_move = self.time_remaining_in_round / self.turns_remaining_in_round - 0.05
+        pondered = self.stop_pondering(game_state, possible_moves)
         if len(possible_moves) == 1:
+            self.start_pondering(game_state, possible_moves[0])
             return possible_moves[0]
 
         current_depth = 1
@@ -42,29 +210,33 @@ class Player(abstract.AbstractPlayer):
 
         # Choosing an arbitrary move in case Minimax does not return an answer:
         best_move = possible_moves[0]
+
+        if pondered is not None:
+            # The opponent played the predicted reply, continuing the iterative deepening of the ponder.
+            current_depth, best_move = pondered
+            current_depth += 1
         
         # Initialize Minimax algorithm, still not running anything
-        minimax = MiniMaxWithAlphaBetaPruning(self.utility, self.color, self.no_more_time, 
-                                              self.selective_deepening_criterion)
+        minimax = self.create_minimax()
 
         # Iterative deepening until the time runs out.
         while True:
             
             #print('going to depth: {}, remaining time: {}, prev_alpha: {}, best_move: {}'.format(
             #    current_depth,
-            #    self.time_for_current_move - (time.process_time() - self.clock),
+            #    self.time_for_current_move - (self.timer() - self.clock),
             #    prev_alpha,
             #    best_move))
             try:
-                (alpha, move), run_time = run_with_limited_time(
-                    minimax.search, (game_state, current_depth, -INFINITY, INFINITY, True), {},
-                    self.time_for_current_move - (time.process_time() - self.clock))
+                (alpha, move), run_time = self.search_iteration(minimax, game_state, current_depth)
             except (ExceededTimeError, MemoryError):
                 print('no more time, achieved depth {}'.format(current_depth))
+                best_move = self.best_so_far(minimax, best_move)
                 break
 
             if self.no_more_time():
                 print('no more time')
+                best_move = self.best_so_far(minimax, best_move)
                 break
 
             prev_alpha = alpha
@@ -78,33 +250,34 @@ class Player(abstract.AbstractPlayer):
                 print('all is lost')
                 break
 
+            if self.search_done(current_depth):
+                break
+
             current_depth += 1
 
+        self.report_search(minimax)
+
         if self.turns_remaining_in_round == 1:
             self.turns_remaining_in_round = self.k
             self.time_remaining_in_round = self.time_per_k_turns
         else:
             self.turns_remaining_in_round -= 1
-            self.time_remaining_in_round -= (time.process_time() - self.clock)
+            self.time_remaining_in_round -= (self.timer() - self.clock)
+        self.start_pondering(game_state, best_move)
         return best_move
 
     def utility(self, state):
-        if len(state.get_possible_moves()) == 0:
+        if not state.has_any_move():
             return INFINITY if state.curr_player != self.color else -INFINITY
         if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
             return 0
 
-        piece_counts = defaultdict(lambda: 0)
-        for loc_val in state.board.values():
-            if loc_val != EM:
-                piece_counts[loc_val] += 1
-        
         opponent_color = OPPONENT_COLOR[self.color]
         
-        my_u = ((PAWN_WEIGHT * piece_counts[PAWN_COLOR[self.color]]) + 
-                (KING_WEIGHT * piece_counts[KING_COLOR[self.color]]))
-        op_u = ((PAWN_WEIGHT * piece_counts[PAWN_COLOR[opponent_color]]) + 
-                (KING_WEIGHT * piece_counts[KING_COLOR[opponent_color]]))
+        my_u = ((PAWN_WEIGHT * state.piece_count(PAWN_COLOR[self.color])) + 
+                (KING_WEIGHT * state.piece_count(KING_COLOR[self.color])))
+        op_u = ((PAWN_WEIGHT * state.piece_count(PAWN_COLOR[opponent_color])) + 
+                (KING_WEIGHT * state.piece_count(KING_COLOR[opponent_color])))
         if my_u == 0:
             # I have no tools left
             return -INFINITY
@@ -114,12 +287,42 @@ class Player(abstract.AbstractPlayer):
         else:
             return my_u - op_u
         
+    def cached_utility(self, state):
+        """The utility of the state, through the evaluation cache.
+        """
+        if state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
+            # The cache key does not include the turns counter, which decides a draw.
+            return self.utility(state)
+        value = self.evaluation_cache.get(state)
+        if value is None:
+            value = self.utility(state)
+            self.evaluation_cache.put(state, value)
+        return value
+
+    def evaluation_weights(self):
+        """A hashable description of the weights of utility. The evaluation cache is cleared when it changes.
+        """
+        return PAWN_WEIGHT, KING_WEIGHT
+
     def selective_deepening_criterion(self, state):
         # Simple player does not selectively deepen into certain nodes.
         return False
 
     def no_more_time(self):
-        return (time.process_time() - self.clock) >= self.time_for_current_move
+        if self.deterministic:
+            return 0 < self.fixed_nodes <= self.minimax.nodes
+        return (self.timer() - self.clock) >= self.time_for_current_move
+
+    def time_left(self):
+        return self.time_for_current_move - (self.timer() - self.clock)
+
+    def close(self):
+        if self.search_pool is not None:
+            self.search_pool.terminate()
+            self.search_pool = None
+        if self.ponderer is not None:
+            self.ponderer.close()
+            self.ponderer = None
 
     def __repr__(self):
         return '{} {}'.format(abstract.AbstractPlayer.__repr__(self), 'simple')
@@ -0,0 +1,158 @@
+"""Pondering: searching on the opponent's time.
+
+After a player returns its move, a background process predicts the opponent's reply and searches the position after
+it by iterative deepening, until the player's next turn. If the opponent played the predicted reply, the player
+continues the iterative deepening of the ponder: it takes the best move of the deepest pondered iteration (or of the
+unfinished one, when proven better), the entries of the ponder's transposition table and its history scores, and
+starts its own iterative deepening one depth deeper.
+
+The pondering runs in its own process, so it does not hold the GIL or count in the process time of the game.
+"""
+import importlib
+import multiprocessing
+import time
+from utils import INFINITY
+
+# The longest time a single ponder may run if the player never asks for its result.
+MAX_PONDER_TIME = 300
+# The depth of the search that predicts the opponent's reply.
+PREDICTION_DEPTH = 2
+# The smallest searched depth of the transposition table entries sent back by a ponder. The entries near the leaves
+# are most of the table, and are searched again in no time.
+SHARED_ENTRY_DEPTH = 2
+
+
+def predict_reply(player, state):
+    """Predicting the reply of the opponent, who is to move in the given state, by a shallow search.
+
+    :return: The predicted move, or None if the opponent has no moves.
+    """
+    minimax = player.create_minimax(no_more_time=lambda: False)
+    predicted_move, best_value = None, INFINITY
+    for move in state.get_possible_moves():
+        undo_record = state.perform_move(move)
+        value, _ = minimax.search(state, PREDICTION_DEPTH - 1, -INFINITY, INFINITY, True)
+        state.undo_move(undo_record)
+        if predicted_move is None or value < best_value:
+            predicted_move, best_value = move, value
+    return predicted_move
+
+
+def ponder(player, conn, state):
+    """Pondering the given state (the opponent to move) until a stop request arrives on the connection.
+
+    :return: A dict of the pondered position key, the predicted reply, and the deepest completed iteration:
+             its depth, value, best move (or the best move so far of the unfinished iteration, if proven better) and
+             the process time it took to reach it. With them, the transposition table entries of the search (see
+             TranspositionTable.export_entries) and the history scores of its move ordering, if the player has them.
+    """
+    start = time.process_time()
+    result = {'key': None, 'reply': predict_reply(player, state), 'depth': 0, 'value': None, 'move': None,
+              'search_time': 0, 'tt_entries': [], 'history': {}}
+    if result['reply'] is None:
+        return result
+    state.perform_move(result['reply'])
+    result['key'] = state.zobrist_key
+
+    def stop_requested():
+        return conn.poll() or time.process_time() - start >= MAX_PONDER_TIME
+
+    minimax = player.create_minimax(no_more_time=stop_requested)
+    depth = 1
+    while not stop_requested():
+        alpha, move = minimax.search(state, depth, -INFINITY, INFINITY, True)
+        if stop_requested():
+            break
+        result.update(depth=depth, value=alpha, move=move, search_time=time.process_time() - start)
+        if alpha in (INFINITY, -INFINITY):
+            break
+        depth += 1
+
+    if result['move'] is not None and minimax.root_result.improves(result['move']):
+        result['move'] = minimax.root_result.move
+    if player.transposition_table is not None:
+        result['tt_entries'] = player.transposition_table.export_entries(SHARED_ENTRY_DEPTH)
+    if player.move_ordering is not None:
+        result['history'] = dict(player.move_ordering.history)
+    return result
+
+
+def ponder_worker(conn, player_module, player_args, player_options):
+    """The main loop of the ponder process.
+
+    Receives ('ponder', state) to start pondering, ('stop',) to send back the result, and ('quit',) to exit.
+    """
+    player = importlib.import_module(player_module).Player(*player_args, **player_options)
+    while True:
+        command = conn.recv()
+        if command[0] == 'quit':
+            break
+        if command[0] == 'ponder':
+            result = ponder(player, conn, command[1])
+            # Waiting for the stop request, if the search ended before it.
+            command = conn.recv()
+            while command[0] not in ('stop', 'quit'):
+                command = conn.recv()
+            if command[0] == 'quit':
+                break
+            conn.send(result)
+
+
+class Ponderer:
+    def __init__(self, player_module, player_args, player_options):
+        """Starting a ponder process with a player of the given class.
+
+        :param player_module: The name of the module of the player class, e.g. 'players.simple_player'.
+        :param player_args: The positional arguments of the player class.
+        :param player_options: The keyword arguments of the player class, without ponder and workers.
+        """
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=ponder_worker,
+                                               args=(child_conn, player_module, player_args, player_options),
+                                               daemon=True)
+        self.process.start()
+        self.pondering = False
+
+        self.ponders = 0
+        self.hits = 0
+        self.time_saved = 0.0
+        self.shared_entries = 0
+
+    def start(self, state):
+        """Pondering the given state, after our move.
+        """
+        self.conn.send(('ponder', state))
+        self.pondering = True
+        self.ponders += 1
+
+    def stop(self, state):
+        """Stopping the ponder, and matching it against the actual state.
+
+        :param state: The state at our turn.
+        :return: The ponder result dict (see ponder) if the opponent played the predicted reply (a ponder hit), or
+                 None. Its move is None if no search iteration was completed.
+        """
+        if not self.pondering:
+            return None
+        self.conn.send(('stop',))
+        result = self.conn.recv()
+        self.pondering = False
+        if result['key'] != state.zobrist_key:
+            return None
+        self.hits += 1
+        self.shared_entries += len(result['tt_entries'])
+        if result['move'] is not None:
+            self.time_saved += result['search_time']
+        return result
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(('quit',))
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+
+    def __str__(self):
+        return 'ponder: {} hits of {} ({:.1%}), {:.2f}s saved, {} table entries shared'.format(
+            self.hits, self.ponders, self.hits / self.ponders if self.ponders else 0, self.time_saved,
+            self.shared_entries)
@@ -0,0 +1,167 @@
+"""
+Playing many games in one process, for self-play and data generation, with as little overhead per move as possible.
+"""
+import contextlib
+import copy
+import os
+import random
+import sys
+import time
+
+import run_game
+from checkers.consts import RED_PLAYER, BLACK_PLAYER, TIE, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
+
+# The reasons a game ended.
+NO_MOVES = 'no moves'
+NO_JUMPS = 'no jumps'
+EXCEEDED_TIME = 'time'
+EXCEEDED_SETUP_TIME = 'setup time'
+
+
+class HeadlessGameRunner(run_game.GameRunner):
+    def __init__(self, setup_time, time_per_k_turns, k, red_player, black_player, state_engine='dict'):
+        """A game runner that never draws the board, and times the players in this thread.
+
+        The players get the state of the game itself instead of a copy of it. They may perform and undo moves on it
+        in place, as the searches do, but must return it as they got it, which is checked after every move. A search
+        run with utils.run_with_limited_time is done with the state when it returns, even if it was cancelled. Only a
+        player whose background_search attribute is True, because its searches may go on in other threads after the
+        move returns, gets a copy of the state. A player is not stopped when it exceeds its time, it loses when the
+        move returns.
+        See run_game.GameRunner for the parameters.
+        """
+        run_game.GameRunner.__init__(self, setup_time, time_per_k_turns, k, 'n', red_player, black_player,
+                                     state_engine)
+        # Filled by run: the number of moves played, the reason the game ended, and color: the time of the player.
+        self.plies = 0
+        self.end_reason = None
+        self.player_times = {RED_PLAYER: 0.0, BLACK_PLAYER: 0.0}
+
+    def setup_player(self, player_class, player_color):
+        start = time.process_time()
+        try:
+            player = player_class(self.setup_time, player_color, self.time_per_k_turns, self.k,
+                                  **self.player_options[player_color])
+        except MemoryError:
+            return True
+
+        self.players[player_color] = player
+        return time.process_time() - start > self.setup_time
+
+    def run(self):
+        """Playing the game.
+        :return: The winner, as run_game.GameRunner.run.
+        """
+        red_player_exceeded = self.setup_player(sys.modules[self.red_player].Player, RED_PLAYER)
+        black_player_exceeded = self.setup_player(sys.modules[self.black_player].Player, BLACK_PLAYER)
+        winner = self.handle_time_expired(red_player_exceeded, black_player_exceeded)
+        if winner:
+            self.end_reason = EXCEEDED_SETUP_TIME
+            self.close_players()
+            return winner
+
+        board_state = self.state_class()
+        remaining_run_times = dict(self.player_move_times)
+        k_count = 0
+
+        while True:
+            color = board_state.curr_player
+            player = self.players[color]
+            possible_moves = board_state.get_possible_moves()
+            if not possible_moves:
+                self.end_reason = NO_MOVES
+                winner = self.make_winner_result(OPPONENT_COLOR[color])
+                break
+
+            player_state = copy.deepcopy(board_state) if getattr(player, 'background_search', False) else board_state
+            snapshot = (board_state.zobrist_key, color, board_state.turns_since_last_jump)
+            start = time.process_time()
+            try:
+                move = player.get_move(player_state, possible_moves)
+            except MemoryError:
+                move = None
+            run_time = time.process_time() - start
+            if (board_state.zobrist_key, board_state.curr_player, board_state.turns_since_last_jump) != snapshot:
+                raise RuntimeError('Player {} changed the game state'.format(player))
+
+            self.player_times[color] += run_time
+            if not getattr(player, 'deterministic', False):
+                remaining_run_times[color] -= run_time
+            if move is None or remaining_run_times[color] < 0:
+                self.end_reason = EXCEEDED_TIME
+                winner = self.make_winner_result(OPPONENT_COLOR[color])
+                break
+
+            board_state.perform_move(move)
+            self.plies += 1
+
+            if board_state.turns_since_last_jump >= MAX_TURNS_NO_JUMP:
+                self.end_reason = NO_JUMPS
+                winner = self.make_winner_result(TIE)
+                break
+
+            if board_state.curr_player == RED_PLAYER:
+                # red and black played.
+                k_count = (k_count + 1) % self.k
+                if k_count == 0:
+                    # K rounds completed. Resetting timers.
+                    remaining_run_times = dict(self.player_move_times)
+
+        self.close_players()
+        return winner
+
+    def summary(self, winner):
+        """A line describing the result of the game.
+        """
+        result = 'tie' if winner == TIE else '{} won'.format(winner[0])
+        return '{} in {} plies ({}), {} {:.2f}s, {} {:.2f}s'.format(
+            result, self.plies, self.end_reason, RED_PLAYER, self.player_times[RED_PLAYER], BLACK_PLAYER,
+            self.player_times[BLACK_PLAYER])
+
+
+def run_batch(games, red_player, black_player, time_per_k_turns=1, k=5, setup_time=2, state_engine='dict',
+              seed=0, quiet=True):
+    """Playing a number of games between two players, in this process.
+
+    :param games: The number of games.
+    :param red_player: The red player, a module name with optional options, see run_game.parse_player_spec.
+    :param black_player: The black player.
+    :param time_per_k_turns: The time of each player for each k moves.
+    :param k: The k above.
+    :param setup_time: The time of each player for its setup.
+    :param state_engine: The name of the game state implementation, one of checkers.STATE_ENGINES.
+    :param seed: The seed of the random module for the first game, the next games get the next seeds.
+    :param quiet: Whether to hide what the players print.
+    :return: A dict of result: the number of games that ended with it, the results are RED_PLAYER, BLACK_PLAYER
+             and TIE.
+    """
+    results = {RED_PLAYER: 0, BLACK_PLAYER: 0, TIE: 0}
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        for game_number in range(int(games)):
+            random.seed(int(seed) + game_number)
+            runner = HeadlessGameRunner(setup_time, time_per_k_turns, k, red_player, black_player, state_engine)
+            with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+                winner = runner.run()
+            results[TIE if winner == TIE else winner[0]] += 1
+            print('game {}: {}'.format(game_number + 1, runner.summary(winner)))
+
+    run_time = time.perf_counter() - start
+    print('{} games in {:.2f}s, {:.2f} games/s: {} {} {} {} ties {}'.format(
+        games, run_time, int(games) / run_time, red_player, results[RED_PLAYER], black_player, results[BLACK_PLAYER],
+        results[TIE]))
+    return results
+
+
+if __name__ == '__main__':
+    try:
+        games, red_player, black_player = sys.argv[1:4]
+        numbers = [float(arg) for arg in sys.argv[4:7]]
+    except ValueError:
+        print("""Syntax: {0} games red_player black_player [time_per_k_turns [k [setup_time [state_engine]]]]
+For example: {0} 1000 random_player random_player
+             {0} 100 simple_player:fixed_depth=2 random_player 1 5 2 bitboard
+The default time is 1 second for every 5 moves, 2 seconds for the setup, on the dict state engine.""".format(
+            sys.argv[0]))
+    else:
+        run_batch(int(games), red_player, black_player, *numbers, *sys.argv[7:8])
@@ -0,0 +1,363 @@
+"""
+Benchmarks for the game engine: search throughput and correctness checks of the engine components.
+"""
+import sys
+import os
+import time
+import random
+from checkers import STATE_ENGINES
+from checkers.consts import RED_PLAYER, BLACK_PLAYER, MY_COLORS, PAWN_COLOR, OPPONENT_COLORS, EM
+from checkers.moves import GameMove, TOOL_CAPTURE_MOVES
+from checkers.positions import STANDARD_POSITIONS, CAPTURE_POSITIONS, standard_states, encode_board, load_position
+from checkers.perft import perft, PERFT_COUNTS, NODES
+from utils import MiniMaxWithAlphaBetaPruning, INFINITY
+from move_ordering import MoveOrdering
+from transposition import TranspositionTable
+from parallel_search import ParallelRootSearch, create_search_pool
+import players.better_h_player as better_h_player
+from players.evaluation import Evaluation
+from players.evaluation1 import Evaluation as Evaluation1
+from players.features import protection_counts
+from players.batch_evaluation import BatchEvaluation, np
+
+SETUP_TIME = 2
+TIME_PER_K_TURNS = 10
+K_ROUNDS = 5
+
+
+def never():
+    return False
+
+
+def never_deepen(state):
+    return False
+
+
+def counted(func):
+    # Wrapping a function to count its calls.
+    def wrapper(*args, **kwargs):
+        wrapper.calls += 1
+        return func(*args, **kwargs)
+    wrapper.calls = 0
+    return wrapper
+
+
+def run_fixed_depth_search(state, depth, iterative=False, **search_options):
+    """Running a fixed depth search of the better_h player (the heuristic evaluation) from the given state, with
+    no time limit.
+
+    :param state: The state to search from, it is not changed.
+    :param depth: The search depth.
+    :param iterative: Whether to search every depth up to the given one, like the players do.
+    :param search_options: Keyword arguments of MiniMaxWithAlphaBetaPruning, e.g. in_place.
+    :return: A tuple: (the search result, the number of searched nodes, the search process time)
+    """
+    player = better_h_player.Player(SETUP_TIME, state.curr_player, TIME_PER_K_TURNS, K_ROUNDS)
+    minimax = MiniMaxWithAlphaBetaPruning(player.utility, player.color, never, player.selective_deepening_criterion,
+                                          **search_options)
+    start = time.process_time()
+    for current_depth in range(1 if iterative else depth, depth + 1):
+        result = minimax.search(state, current_depth, -INFINITY, INFINITY, True)
+    return result, minimax.nodes, time.process_time() - start
+
+
+def playout_states(state_class, games=20, seed=1):
+    """The states of random games, for checks that need more positions than the standard ones.
+    """
+    rng = random.Random(seed)
+    states = []
+    for _ in range(games):
+        state = state_class()
+        moves = state.get_possible_moves()
+        while moves and state.turns_since_last_jump < 50:
+            states.append(state)
+            state = state.__class__.from_board(state.board, state.curr_player, state.turns_since_last_jump)
+            state.perform_move(rng.choice(moves))
+            moves = state.get_possible_moves()
+    return states
+
+
+def bench_engines(depth='5', repeat='5'):
+    """Comparing the nodes per second of a fixed depth search from the initial state in every state engine, with
+    the deep-copy search and in place. The engines take turns, and the best time of each is reported, so a change in
+    the load of the machine does not favour one of them.
+    """
+    best = {}
+    for _ in range(int(repeat)):
+        for name, state_class in sorted(STATE_ENGINES.items()):
+            for in_place in (False, True):
+                (alpha, move), nodes, run_time = run_fixed_depth_search(state_class(), int(depth), in_place=in_place)
+                if (name, in_place) not in best or run_time < best[(name, in_place)][3]:
+                    best[(name, in_place)] = (alpha, move, nodes, run_time)
+    for (name, in_place), (alpha, move, nodes, run_time) in sorted(best.items()):
+        print('{:>10} {:>8}: value {}, move: {}, {} nodes in {:.3f}s, {:.0f} nodes/s'.format(
+            name, 'in place' if in_place else 'deepcopy', alpha, move, nodes, run_time,
+            nodes / run_time if run_time else 0))
+
+
+def bench_in_place(depth='4'):
+    """Checking that the make/unmake search returns the same values as the deep-copy search, and timing both.
+    """
+    for name, state_class in sorted(STATE_ENGINES.items()):
+        run_times = {False: 0, True: 0}
+        for state in standard_states(state_class):
+            before = state.board.copy()
+            results = {}
+            for in_place in (False, True):
+                (alpha, move), nodes, run_time = run_fixed_depth_search(state, int(depth), in_place=in_place)
+                results[in_place] = (alpha, str(move), nodes)
+                run_times[in_place] += run_time
+            assert results[False] == results[True], 'in place search mismatch: {}'.format(results)
+            assert state.board == before, 'in place search did not restore the state'
+        print('{:>10}: same values, deepcopy {:.3f}s, in place {:.3f}s'.format(name, run_times[False], run_times[True]))
+
+
+def bench_ordering(depth='6', engine='bitboard'):
+    """Comparing the searched nodes of iterative deepening on the standard positions without and with move ordering.
+    """
+    totals = {False: [0, 0], True: [0, 0]}
+    for (name, _, _), state in zip(STANDARD_POSITIONS, standard_states(STATE_ENGINES[engine])):
+        counts = []
+        for ordered in (False, True):
+            (alpha, move), nodes, run_time = run_fixed_depth_search(
+                state, int(depth), iterative=True, in_place=True, move_ordering=MoveOrdering() if ordered else None)
+            assert not counts or counts[0][0] == alpha, 'move ordering changed the value of {}'.format(name)
+            counts.append((alpha, nodes))
+            totals[ordered][0] += nodes
+            totals[ordered][1] += run_time
+        print('{:>20}: {:>8} nodes unordered, {:>8} nodes ordered'.format(name, counts[0][1], counts[1][1]))
+    print('{:>20}: {:>8} nodes unordered ({:.2f}s), {:>8} nodes ordered ({:.2f}s), {:.1%} of the nodes'.format(
+        'total', totals[False][0], totals[False][1], totals[True][0], totals[True][1],
+        totals[True][0] / totals[False][0]))
+
+
+def bench_staged(depth='6', engine='bitboard'):
+    """Comparing iterative deepening on the standard positions with the moves generated as lists and in stages, with
+    a transposition table and move ordering and without them. The values must be the same.
+    """
+    for options_name, search_options in (('plain', lambda: {}),
+                                         ('tt + ordering', lambda: {'transposition_table': TranspositionTable(16),
+                                                                    'move_ordering': MoveOrdering()})):
+        totals = {False: [0, 0], True: [0, 0]}
+        for (name, _, _), state in zip(STANDARD_POSITIONS, standard_states(STATE_ENGINES[engine])):
+            values = []
+            for staged in (False, True):
+                (alpha, move), nodes, run_time = run_fixed_depth_search(
+                    state, int(depth), iterative=True, in_place=True, staged_moves=staged, **search_options())
+                values.append(alpha)
+                totals[staged][0] += nodes
+                totals[staged][1] += run_time
+            assert values[0] == values[1], 'staged moves changed the value of {}'.format(name)
+        print('{:>14}: {:>8} nodes in {:.2f}s with lists, {:>8} nodes in {:.2f}s staged'.format(
+            options_name, totals[False][0], totals[False][1], totals[True][0], totals[True][1]))
+
+
+def bench_parallel(depth='5', max_workers=None, engine='bitboard'):
+    """Measuring the speedup of the root-parallel search on the standard positions against the number of workers.
+    """
+    max_workers = int(max_workers) if max_workers else os.cpu_count()
+    states = standard_states(STATE_ENGINES[engine])
+
+    start = time.perf_counter()
+    values = [run_fixed_depth_search(state, int(depth), in_place=True)[0][0] for state in states]
+    base_time = time.perf_counter() - start
+    print('{:>2} process: {:.2f}s'.format(1, base_time))
+
+    workers = 2
+    while workers <= max(max_workers, 2):
+        # The workers evaluate for a fixed color, so there is a pool for each player to move.
+        pools = {color: create_search_pool(workers, better_h_player.__name__,
+                                           (SETUP_TIME, color, TIME_PER_K_TURNS, K_ROUNDS), {})
+                 for color in (RED_PLAYER, BLACK_PLAYER)}
+        start = time.perf_counter()
+        for state, value in zip(states, values):
+            search = ParallelRootSearch(pools[state.curr_player], state.curr_player, never, lambda: INFINITY)
+            alpha, move = search.search(state, int(depth), -INFINITY, INFINITY, True)
+            assert alpha == value, 'parallel search value {} != {}'.format(alpha, value)
+        run_time = time.perf_counter() - start
+        print('{:>2} workers: {:.2f}s, speedup {:.2f}'.format(workers, run_time, base_time / run_time))
+        for pool in pools.values():
+            pool.terminate()
+        workers *= 2
+
+
+def bench_features(repeat='20'):
+    """Checking the one-pass protection counts against the per piece checks of the evaluation, and timing both and
+    the evaluations per leaf.
+    """
+    states = standard_states(STATE_ENGINES['dict']) + playout_states(STATE_ENGINES['dict'])
+    evaluation = Evaluation(RED_PLAYER)
+
+    def per_piece_counts(state, color):
+        locs = [loc for loc, val in state.board.items() if val in MY_COLORS[color]]
+        protected = sum(evaluation.is_protected(state, PAWN_COLOR[color], loc) for loc in locs)
+        can_be_taken = sum(not evaluation.is_protected(state, PAWN_COLOR[color], loc) and
+                           evaluation.is_can_be_taken(state, PAWN_COLOR[color], loc) for loc in locs)
+        return protected, can_be_taken
+
+    def one_pass_counts(state, color):
+        locs = [loc for loc, val in state.board.items() if val in MY_COLORS[color]]
+        return protection_counts(state.board, locs, color)
+
+    for state in states:
+        for color in (RED_PLAYER, BLACK_PLAYER):
+            assert per_piece_counts(state, color) == one_pass_counts(state, color), 'protection counts mismatch'
+    print('same protection counts in {} positions'.format(len(states)))
+
+    for name, func in (('per piece', per_piece_counts), ('one pass', one_pass_counts),
+                       ('evaluation', lambda state, color: Evaluation(color).utility(state)),
+                       ('evaluation1', lambda state, color: Evaluation1(color).utility(state))):
+        start = time.process_time()
+        for _ in range(int(repeat)):
+            for state in states:
+                func(state, RED_PLAYER)
+        run_time = time.process_time() - start
+        print('{:>12}: {:.1f}us per leaf'.format(name, run_time / (int(repeat) * len(states)) * 1e6))
+
+
+def bench_batch(depth='4', engine='bitboard'):
+    """Comparing a fixed depth search with the evaluation1 utility leaf by leaf, and with the leaves of each depth 1
+    node evaluated in one NumPy batch. The values and moves must be the same.
+    """
+    if np is None:
+        print('the batch evaluation requires numpy')
+        return
+    run_times = {False: 0, True: 0}
+    batches = 0
+    for state in standard_states(STATE_ENGINES[engine]):
+        results = {}
+        for batched in (False, True):
+            batch_evaluation = BatchEvaluation(state.curr_player)
+            if batched:
+                batch_evaluation.evaluate_boards = counted(batch_evaluation.evaluate_boards)
+            minimax = MiniMaxWithAlphaBetaPruning(Evaluation1(state.curr_player).utility, state.curr_player, never,
+                                                  never_deepen, in_place=True,
+                                                  batch_evaluation=batch_evaluation if batched else None)
+            start = time.process_time()
+            alpha, move = minimax.search(state, int(depth), -INFINITY, INFINITY, True)
+            run_times[batched] += time.process_time() - start
+            results[batched] = (alpha, str(move))
+            if batched:
+                batches += batch_evaluation.evaluate_boards.calls
+        assert results[False] == results[True], 'batch search mismatch: {}'.format(results)
+    print('same values, leaf by leaf {:.3f}s, batched {:.3f}s in {} batches'.format(
+        run_times[False], run_times[True], batches))
+
+
+def recursive_capture_sequences(state, origin_loc, cur_loc, already_jumped):
+    """The former recursive capture sequence search of the dict engine, with every route of every sequence, as the
+    reference of bench_captures.
+    """
+    board = state.board
+    capture_seqs = []
+    for jumped, next_loc in TOOL_CAPTURE_MOVES[board[origin_loc]][cur_loc]:
+        if (board[jumped] in OPPONENT_COLORS[state.curr_player] and (board[next_loc] == EM or next_loc == origin_loc)
+                and jumped not in already_jumped):
+            for target, seq in recursive_capture_sequences(state, origin_loc, next_loc, already_jumped + [jumped]):
+                capture_seqs.append((target, [jumped] + seq))
+    return capture_seqs or [(cur_loc, [])]
+
+
+def bench_captures(repeat='20'):
+    """Checking that the capture moves of both engines lead to the same positions as every route of the recursive
+    search, with no two moves leading to the same position, and timing the capture sequence searches.
+    """
+    dict_engine = STATE_ENGINES['dict']
+    states = (standard_states(dict_engine) + standard_states(dict_engine, CAPTURE_POSITIONS) +
+              playout_states(dict_engine))
+
+    def resulting_positions(state, moves):
+        positions = []
+        for move in moves:
+            undo_record = state.perform_move(move)
+            positions.append(encode_board(state.board))
+            state.undo_move(undo_record)
+        return positions
+
+    def capture_origins(state):
+        return set(origin for origin, _, _ in state.calc_capture_moves())
+
+    routes = moves = 0
+    for state in states:
+        origins = capture_origins(state)
+        if not origins:
+            continue
+        reference_moves = [GameMove(state.board[origin], origin, target, seq)
+                           for origin in origins
+                           for target, seq in recursive_capture_sequences(state, origin, origin, [])]
+        reference = set(resulting_positions(state, reference_moves))
+        routes += len(reference_moves)
+        for state_class in STATE_ENGINES.values():
+            engine_state = state_class.from_board(state.board, state.curr_player)
+            engine_moves = engine_state.calc_possible_moves()
+            positions = resulting_positions(engine_state, engine_moves)
+            assert len(set(positions)) == len(positions), 'capture moves with the same resulting position'
+            assert set(positions) == reference, 'capture moves mismatch'
+        moves += len(engine_moves)
+    print('same resulting positions in {} positions, {} capture moves instead of {} routes'.format(
+        len(states), moves, routes))
+
+    capture_states = [(state, capture_origins(state)) for state in states if capture_origins(state)]
+    for name, func in (('recursive', lambda state, origin: recursive_capture_sequences(state, origin, origin, [])),
+                       ('iterative', lambda state, origin: state.find_capture_sequences(origin))):
+        start = time.process_time()
+        for _ in range(int(repeat)):
+            for state, origins in capture_states:
+                for origin in origins:
+                    func(state, origin)
+        run_time = time.process_time() - start
+        print('{:>10}: {:.1f}us per position'.format(name, run_time / (int(repeat) * len(capture_states)) * 1e6))
+
+
+def bench_perft(depth='6', engine='bitboard'):
+    """Counting the moves of the positions with known perft counts, up to the given depth or the known one, and
+    checking the counts of every depth. The nodes per second are of all the depths.
+    """
+    total_nodes = 0
+    total_time = 0
+    for name, board_text, curr_player in STANDARD_POSITIONS + CAPTURE_POSITIONS:
+        known_counts = PERFT_COUNTS[name]
+        state = load_position(STATE_ENGINES[engine], board_text, curr_player)
+        start = time.process_time()
+        counts = perft(state, min(int(depth), len(known_counts)))
+        run_time = time.process_time() - start
+        assert counts == known_counts[:len(counts)], 'perft mismatch in {}: {}'.format(name, counts)
+        nodes = sum(depth_counts[NODES] for depth_counts in counts)
+        total_nodes += nodes
+        total_time += run_time
+        print('{:>20}: {} nodes in {:.3f}s, {:.0f} nodes/s'.format(name, nodes, run_time, nodes / run_time))
+        if name == STANDARD_POSITIONS[0][0]:
+            for i, (depth_nodes, captures, promotions) in enumerate(counts):
+                print('{:>22} {}: {} nodes, {} captures, {} promotions'.format('depth', i + 1, depth_nodes, captures,
+                                                                               promotions))
+    print('all counts as known, {} nodes in {:.3f}s, {:.0f} nodes/s'.format(total_nodes, total_time,
+                                                                         total_nodes / total_time))
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'captures': bench_captures,
+    'engines': bench_engines,
+    'features': bench_features,
+    'inplace': bench_in_place,
+    'ordering': bench_ordering,
+    'parallel': bench_parallel,
+    'perft': bench_perft,
+    'staged': bench_staged,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in BENCHMARKS:
+        BENCHMARKS[sys.argv[1]](*sys.argv[2:])
+    else:
+        print("""Syntax: {0} benchmark [args]
+For example: {0} engines 5
+         {0} inplace 4
+         {0} ordering 6 bitboard
+         {0} parallel 5 16
+         {0} features 20
+         {0} batch 4 bitboard
+         {0} captures 20
+         {0} perft 8 dict
+         {0} staged 6 bitboard
+Available benchmarks: {1}""".format(sys.argv[0], ', '.join(sorted(BENCHMARKS))))
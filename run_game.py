@@ -2,7 +2,8 @@
 A generic turn-based game runner.
 """
 import sys
-from checkers.board import GameState
+import ast
+from checkers import STATE_ENGINES
 from checkers.consts import RED_PLAYER, BLACK_PLAYER, TIE, OPPONENT_COLOR, MAX_TURNS_NO_JUMP
 import utils
 import copy
@@ -10,8 +11,27 @@ import players.interactive
 # import tkinter as tk
 
 
+def parse_player_spec(spec):
+    """Splitting a player given on the command line into its module name and its options.
+
+    The options follow the module name after a colon, as comma separated name=value pairs, and are passed to the
+    player class as keyword arguments. E.g. "simple_player:tt_size_mb=16" is the simple player created with
+    tt_size_mb=16. Values are read as Python literals when possible, and as strings otherwise.
+    :return: A tuple: (The module name, A dict of the options)
+    """
+    name, _, options_spec = spec.partition(':')
+    options = {}
+    for option in filter(None, options_spec.split(',')):
+        key, _, value = option.partition('=')
+        try:
+            options[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            options[key.strip()] = value.strip()
+    return name, options
+
+
 class GameRunner:
-    def __init__(self, setup_time, time_per_k_turns, k, verbose, red_player, black_player):
+    def __init__(self, setup_time, time_per_k_turns, k, verbose, red_player, black_player, state_engine='dict'):
         """Game runner initialization.
 
         :param setup_time: Setup time allowed for each player in seconds.
@@ -20,8 +40,11 @@ class GameRunner:
         :param k: The k turns we measure time on. Must be a positive integer.
         :param verbose: preference of printing the board each turn. 'y' - yes, print. 'n' - no,  don't print.
         :param red_player: The name of the module containing the red player. E.g. "myplayer" will invoke an
-            equivalent to "import players.myplayer" in the code.
+            equivalent to "import players.myplayer" in the code. It may be followed by player options, see
+            parse_player_spec. A player with the fixed_depth or fixed_nodes option is not limited by the time.
         :param black_player: Same as 'red_player' parameter, but for the black one.
+        :param state_engine: The name of the game state implementation to play with, one of
+            checkers.STATE_ENGINES. E.g. 'dict' (the default) or 'bitboard'.
         """
 
         self.verbose = verbose.lower()
@@ -29,8 +52,15 @@ class GameRunner:
         self.time_per_k_turns = float(time_per_k_turns)
         self.k = int(k)
         self.players = {}
+        self.state_class = STATE_ENGINES[state_engine]
 
         # Dynamically importing the players. This allows maximum flexibility and modularity.
+        red_player, red_options = parse_player_spec(red_player)
+        black_player, black_options = parse_player_spec(black_player)
+        self.player_options = {
+            RED_PLAYER: red_options,
+            BLACK_PLAYER: black_options,
+        }
         self.red_player = 'players.{}'.format(red_player)
         self.black_player = 'players.{}'.format(black_player)
         __import__(self.red_player)
@@ -52,7 +82,8 @@ class GameRunner:
         """
         try:
             player, measured_time = utils.run_with_limited_time(
-                player_class, (self.setup_time, player_color, self.time_per_k_turns, self.k), {}, self.setup_time * 1.5)
+                player_class, (self.setup_time, player_color, self.time_per_k_turns, self.k),
+                self.player_options[player_color], self.setup_time * 1.5)
         except MemoryError:
             return True
 
@@ -78,9 +109,10 @@ class GameRunner:
         black_player_exceeded = self.setup_player(sys.modules[self.black_player].Player, BLACK_PLAYER)
         winner = self.handle_time_expired(red_player_exceeded, black_player_exceeded)
         if winner:  # One of the players exceeded the setup time
+            self.close_players()
             return winner
 
-        board_state = GameState()
+        board_state = self.state_class()
         remaining_run_times = copy.deepcopy(self.player_move_times)
         k_count = 0
 
@@ -98,12 +130,17 @@ class GameRunner:
                     winner = self.make_winner_result(OPPONENT_COLOR[board_state.curr_player])
                     break
                 # Get move from player
-                move, run_time = utils.run_with_limited_time(
-                    player.get_move, (copy.deepcopy(board_state), possible_moves), {}, remaining_run_time * 1.5)  ###
-
-                remaining_run_times[board_state.curr_player] -= run_time
-                if remaining_run_times[board_state.curr_player] < 0:
-                    raise utils.ExceededTimeError
+                if getattr(player, 'deterministic', False):
+                    # A player with a fixed depth or number of nodes is not limited by the clock, so a game between
+                    # such players is the same in every run.
+                    move = player.get_move(copy.deepcopy(board_state), possible_moves)
+                else:
+                    move, run_time = utils.run_with_limited_time(
+                        player.get_move, (copy.deepcopy(board_state), possible_moves), {}, remaining_run_time * 1.5)  ###
+
+                    remaining_run_times[board_state.curr_player] -= run_time
+                    if remaining_run_times[board_state.curr_player] < 0:
+                        raise utils.ExceededTimeError
 
             except (utils.ExceededTimeError, MemoryError):
                 print('Player {} exceeded resources.'.format(player))
@@ -126,9 +163,14 @@ class GameRunner:
                     # K rounds completed. Resetting timers.
                     remaining_run_times = copy.deepcopy(self.player_move_times)
 
+        self.close_players()
         self.end_game(winner)
         return winner
 
+    def close_players(self):
+        for player in self.players.values():
+            player.close()
+
     @staticmethod
     def end_game(winner):
         if winner == TIE:
@@ -161,7 +203,10 @@ if __name__ == '__main__':
     try:
         GameRunner(*sys.argv[1:]).run()
     except TypeError:
-        print("""Syntax: {0} setup_time time_per_k_turns k verbose red_player black_player
+        print("""Syntax: {0} setup_time time_per_k_turns k verbose red_player black_player [state_engine]
 For example: {0} 2 10 5 y interactive random_player
+             {0} 2 10 5 n simple_player:tt_size_mb=16 random_player bitboard
+             {0} 2 10 5 n simple_player:fixed_depth=4 better_h_player:fixed_nodes=20000
+state_engine is one of: {1} (default: dict)
 Please read the docs in the code for more info.""".
-              format(sys.argv[0]))
+              format(sys.argv[0], ', '.join(sorted(STATE_ENGINES))))
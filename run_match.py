@@ -0,0 +1,104 @@
+"""
+Engine-vs-engine matches that stop as soon as a sequential probability ratio test decides between two Elo bounds.
+"""
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import run_test
+from sprt import SPRT, ACCEPT_H1
+
+DEFAULT_MAX_GAMES = 400
+
+
+def match_game(game_number, p1, p2, round_time):
+    """The arguments of run_test.run_single_test for a game of a match.
+
+    The players swap colours every game, and every seed is played once with each of them as red.
+    :return: A tuple: (the arguments, whether p1 is red)
+    """
+    p1_is_red = game_number % 2 == 0
+    red, black = (p1, p2) if p1_is_red else (p2, p1)
+    return (round_time, red, black, game_number // 2), p1_is_red
+
+
+def run_match(p1, p2, round_time, elo0=0.0, elo1=50.0, alpha=0.05, beta=0.05, max_games=DEFAULT_MAX_GAMES,
+              workers=1):
+    """Playing games between two players until the SPRT of the results of p1 reaches a decision.
+
+    :param p1: The first player, a module name with optional options, see run_game.parse_player_spec.
+    :param p2: The second player.
+    :param round_time: The time for each k rounds of a game.
+    :param elo0: The Elo difference of H0, see sprt.SPRT.
+    :param elo1: The Elo difference of H1.
+    :param alpha: The probability of accepting H1 when H0 is true.
+    :param beta: The probability of accepting H0 when H1 is true.
+    :param max_games: The number of games after which the match stops without a decision.
+    :param workers: The number of games played at once, capped at the number of physical cores, see
+                    run_test.run_all_tests. The results are added to the SPRT in the order of the games, a game
+                    that ends early waits for the games before it, so the test sees the same sequence as with one
+                    worker. The games after the one that decides the test are not counted.
+    :return: The SPRT of the match.
+    """
+    sprt = SPRT(elo0, elo1, alpha, beta)
+    workers = max(1, min(int(workers), run_test.physical_cores()))
+    start = time.time()
+
+    def add_game(game_number, result, p1_is_red):
+        score = result[3] if p1_is_red else result[4]
+        decision = sprt.add_result(score)
+        print('game {}: {} {} as {}, {}'.format(game_number + 1, p1, {1: 'won', 0.5: 'tied', 0: 'lost'}[score],
+                                               'red' if p1_is_red else 'black', sprt))
+        return decision
+
+    decision = None
+    if workers == 1:
+        for game_number in range(max_games):
+            args, p1_is_red = match_game(game_number, p1, p2, round_time)
+            decision = add_game(game_number, run_test.run_single_test(*args), p1_is_red)
+            if decision is not None:
+                break
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            running = {}
+            # game number: (result, whether p1 is red), for the games that ended before an earlier game.
+            finished = {}
+            next_game = next_result = 0
+            while decision is None and (running or next_game < max_games):
+                while len(running) < workers and next_game < max_games:
+                    args, p1_is_red = match_game(next_game, p1, p2, round_time)
+                    running[executor.submit(run_test.run_single_test, *args)] = (next_game, p1_is_red)
+                    next_game += 1
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    game_number, p1_is_red = running.pop(future)
+                    finished[game_number] = (future.result(), p1_is_red)
+                while decision is None and next_result in finished:
+                    decision = add_game(next_result, *finished.pop(next_result))
+                    next_result += 1
+            for future in running:
+                future.cancel()
+
+    print('{} in {} games ({:.1f}s)'.format(
+        'no decision' if decision is None else
+        '{} accepted: {} is {} than {} by {} Elo'.format(decision, p1, 'stronger' if decision == ACCEPT_H1 else
+                                                         'not stronger', p2, elo1 if decision == ACCEPT_H1 else elo0),
+        sprt.games, time.time() - start))
+    print(sprt)
+    print('LLR trajectory: ' + ' '.join('{:.2f}'.format(llr) for _, llr in sprt.trajectory))
+    return sprt
+
+
+if __name__ == '__main__':
+    try:
+        p1, p2, round_time = sys.argv[1:4]
+        numbers = [float(arg) for arg in sys.argv[4:8]]
+        limits = [int(arg) for arg in sys.argv[8:10]]
+    except ValueError:
+        print("""Syntax: {0} player1 player2 round_time [elo0 elo1 alpha beta [max_games [workers]]]
+For example: {0} better_h_player simple_player 2
+             {0} better_h_player:tt_size_mb=16 better_h_player 10 0 20 0.05 0.05 1000 4
+The default test is elo0=0 elo1=50 alpha=0.05 beta=0.05, for at most {1} games on one worker.""".format(
+            sys.argv[0], DEFAULT_MAX_GAMES))
+    else:
+        run_match(p1, p2, round_time, *(numbers + limits))
@@ -1,4 +1,10 @@
 import csv
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import run_game
 from checkers.consts import RED_PLAYER, BLACK_PLAYER
@@ -6,49 +12,174 @@ from checkers.consts import RED_PLAYER, BLACK_PLAYER
 SETUP_TIME = 2
 K_ROUNDS = 5
 IS_VERBOSE = 'n'
+STATE_ENGINE = 'dict'
 LOSE_SCORE = 0
 TIE_SCORE = 0.5
 WIN_SCORE = 1
+# The manifest of a tournament is kept next to its results file, with this suffix.
+MANIFEST_SUFFIX = '.manifest'
 
 
-def run_all_tests(test_times, players_kind, results_file_name):
+def physical_cores():
+    """The number of physical CPU cores this process may run on.
+
+    Two games on the hyper-threads of one core slow each other down, and the players measure their time limits in
+    CPU time, so a tournament runs at most one game per physical core.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    cores = set()
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            physical_id = None
+            for line in cpuinfo:
+                key, _, value = line.partition(':')
+                if key.strip() == 'physical id':
+                    physical_id = value.strip()
+                elif key.strip() == 'core id':
+                    cores.add((physical_id, value.strip()))
+    except OSError:
+        pass
+    return max(1, min(available, len(cores) or available))
+
+
+class TournamentManifest:
+    def __init__(self, file_name):
+        """
+        a durable record of the scheduled and finished games of a tournament, so an interrupted tournament can be
+        resumed. The file holds a JSON record per line, and is appended and synced to the disk on every change. An
+        existing file is loaded, a last line cut by a crash is ignored.
+        :param file_name: the manifest file
+        """
+        self.file_name = file_name
+        self.scheduled = set()
+        # game key: the result of the game, in the order the games finished.
+        self.finished = {}
+        if os.path.exists(file_name):
+            with open(file_name) as manifest_file:
+                for line in manifest_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.scheduled.add(record['game'])
+                    if record['status'] == 'done':
+                        self.finished[record['game']] = record['result']
+
+    @staticmethod
+    def game_key(round_time, p1, p2, seed):
+        # the key of a game is its pairing, time control and seed
+        return '{}|{}|{}|{}'.format(p1, p2, round_time, seed)
+
+    def schedule(self, tests):
+        for test in tests:
+            key = self.game_key(*test)
+            if key not in self.scheduled:
+                self.scheduled.add(key)
+                self.append({'game': key, 'status': 'scheduled'})
+
+    def finish(self, test, result):
+        key = self.game_key(*test)
+        self.finished[key] = result
+        self.append({'game': key, 'status': 'done', 'result': result})
+
+    def is_finished(self, test):
+        return self.game_key(*test) in self.finished
+
+    def append(self, record):
+        with open(self.file_name, 'a') as manifest_file:
+            manifest_file.write(json.dumps(record) + '\n')
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+
+def schedule_tests(test_times, players_kind, seeds=(0,)):
+    """
+    list the games of a tournament, every pairing of different players for every time and seed
+    :return: list of (round_time, p1, p2, seed)
+    """
+    # avoid game with the same kind of players
+    return [(round_time, p1, p2, seed)
+            for round_time in test_times
+            for p1 in players_kind
+            for p2 in players_kind
+            if p1 != p2
+            for seed in seeds]
+
+
+def run_all_tests(test_times, players_kind, results_file_name, workers=None, seeds=(0,), resume=True):
     """
     run all tests according to the given params and write into a file
     :param test_times: list of times to run the game [2,10,50]
     :param players_kind: list of different kind of players (simple, better etc..)
-    :param results_file_name: the name of the file to write results to
+    :param results_file_name: the name of the file to write results to. Each result is appended when its game ends,
+        in the order the games end.
+    :param workers: the number of games played at once, in separate processes. At most (and by default) the number
+        of physical cores. Players that search on several processes themselves should be given fewer workers.
+    :param seeds: the random seeds of the games, every pairing and time is played once with each
+    :param resume: whether to continue the tournament of the manifest of the results file, skipping the games it
+        has finished. Otherwise (or without a manifest) the tournament starts over.
     :return: void
     """
-    test_number = 0
-    test_results = []
-
-    for time in test_times:
-        for p1 in players_kind:
-            for p2 in players_kind:
-                # avoid game with the same kind of players
-                if p1 == p2:
-                    continue
+    tests = schedule_tests(test_times, players_kind, seeds)
+    workers = physical_cores() if workers is None else max(1, min(int(workers), physical_cores()))
+    start = time.time()
+
+    manifest_file_name = results_file_name + MANIFEST_SUFFIX
+    if not resume and os.path.exists(manifest_file_name):
+        os.remove(manifest_file_name)
+    manifest = TournamentManifest(manifest_file_name)
+    manifest.schedule(tests)
+    # The results file is rewritten from the manifest, so it never has a result twice, or one of an earlier sweep.
+    write_results_to_csv_file(list(manifest.finished.values()), results_file_name)
+    remaining_tests = [(test_number, test) for test_number, test in enumerate(tests, 1)
+                       if not manifest.is_finished(test)]
+    if len(remaining_tests) < len(tests):
+        print("resuming: {} of {} games are done".format(len(tests) - len(remaining_tests), len(tests)))
+
+    if workers == 1:
+        for test_number, test in remaining_tests:
+            print_test(test_number, *test)
+            single_test_result = run_single_test(*test)
+            print(single_test_result)
+            manifest.finish(test, single_test_result)
+            append_result_to_csv_file(single_test_result, results_file_name)
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = {}
+            for test_number, test in remaining_tests:
+                print_test(test_number, *test)
+                futures[executor.submit(run_single_test, *test)] = (test_number, test)
+            for future in as_completed(futures):
+                single_test_result = future.result()
+                test_number, test = futures[future]
+                print("test " + str(test_number) + ") done: " + str(single_test_result))
+                manifest.finish(test, single_test_result)
+                append_result_to_csv_file(single_test_result, results_file_name)
 
-                test_number += 1
-                print("test " + str(
-                    test_number) + ") => player 1: " + p1 + ". player 2: " + p2 + ". time: " + str(time))
+    print("{} games in {:.1f}s, {} at a time".format(len(remaining_tests), time.time() - start, workers))
 
-                single_test_result = run_single_test(time, p1, p2)
-                print(single_test_result)
-                test_results.append(single_test_result)
 
-    write_results_to_csv_file(test_results, results_file_name)
+def print_test(test_number, round_time, p1, p2, seed):
+    print("test " + str(test_number) + ") => player 1: " + p1 + ". player 2: " + p2 + ". time: " + str(
+        round_time) + ". seed: " + str(seed))
 
 
-def run_single_test(round_time, p1, p2):
+def run_single_test(round_time, p1, p2, seed=None):
     """run a single test according to params
     :param round_time: time for each k_rounds
     :param p1: the kind of player 1
     :param p2: the kind of player 2
+    :param seed: the seed of the random module for the game, or None to leave it as is
     :return: list representing the test result [player1, player2, round_time, player1_score, player2_score]
     """
-    # args: setup_time = 2, round_time = var, k_rounds = 5, is_verbose = no, player1 = var, player2 = var
-    args = [SETUP_TIME, round_time, K_ROUNDS, IS_VERBOSE, p1, p2]
+    if seed is not None:
+        random.seed(seed)
+    # args: setup_time = 2, round_time = var, k_rounds = 5, is_verbose = no, player1 = var, player2 = var,
+    # state_engine = dict
+    args = [SETUP_TIME, round_time, K_ROUNDS, IS_VERBOSE, p1, p2, STATE_ENGINE]
     test_result = [p1, p2, round_time]
 
     game_result = run_game.GameRunner(*args).run()
@@ -71,6 +202,17 @@ def get_game_score(game_result):
         return [LOSE_SCORE, WIN_SCORE]
 
 
+def append_result_to_csv_file(result, file_name):
+    """
+    append a single test result to csv file, the file is closed (and flushed) before returning
+    :param result: the result of a test
+    :param file_name: csv file to append into
+    :return: void
+    """
+    with open(file_name, 'a', newline='') as csvfile:
+        csv.writer(csvfile).writerow(result)
+
+
 def write_results_to_csv_file(results, file_name):
     """
     write all tests results to csv file
@@ -88,4 +230,12 @@ if __name__ == '__main__':
     test_times = ['2','10','50']
     players_kind = ['simple_player', 'better_h_player', 'improved_player', 'improved_better_h_player']
     file_name = 'experiments.csv'
-    run_all_tests(test_times, players_kind, file_name)
+    # The number of games played at once may be given on the command line, e.g. "run_test.py 4", and 'n' after it
+    # starts the tournament over instead of resuming it, e.g. "run_test.py 4 n". Options for all the players may
+    # follow, see run_game.parse_player_spec, e.g. "run_test.py 4 y fixed_depth=5" for a reproducible tournament.
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    resume = len(sys.argv) <= 2 or sys.argv[2].lower() != 'n'
+    if len(sys.argv) > 3:
+        players_kind = ['{}:{}'.format(kind, sys.argv[3]) for kind in players_kind]
+        file_name = 'experiments_{}.csv'.format(sys.argv[3].replace('=', '').replace(',', '_'))
+    run_all_tests(test_times, players_kind, file_name, workers, resume=resume)
@@ -0,0 +1,116 @@
+"""Sequential probability ratio test (SPRT) of the results of a match, to stop it as soon as they decide between two
+Elo differences.
+
+The results are scored 1, 0.5 or 0 for the first player. The log-likelihood ratio of "the first player is stronger by
+elo1" against "by elo0" is approximated from the mean and the variance of the scores (the trinomial GSPRT), and the
+match stops once it leaves the bounds set by the error rates alpha and beta.
+"""
+import math
+
+# Half a game added to each of the wins, draws and losses. Without it the variance of a match whose games all ended
+# alike is 0, and its first game would decide the test. With it, a player that wins every game is accepted as
+# stronger by elo1=50 after 8 games.
+RESULTS_PRIOR = 0.5
+# The quantile of the normal distribution for the 95% error bars of the Elo estimate.
+CONFIDENCE_QUANTILE = 1.959964
+
+ACCEPT_H0 = 'H0'
+ACCEPT_H1 = 'H1'
+
+
+def elo_to_score(elo):
+    """The expected score of a player stronger by the given Elo difference, by the logistic model.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+class SPRT:
+    def __init__(self, elo0=0.0, elo1=50.0, alpha=0.05, beta=0.05):
+        """Initialize a test with no results.
+
+        :param elo0: The Elo difference of H0, accepted when the first player is not stronger by more than it.
+        :param elo1: The Elo difference of H1, accepted when the first player is stronger by at least it.
+        :param alpha: The probability of accepting H1 when H0 is true.
+        :param beta: The probability of accepting H0 when H1 is true.
+        """
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self.upper_bound = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        # The (games, log-likelihood ratio) after every game.
+        self.trajectory = []
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add_result(self, score):
+        """Adding the result of a game.
+
+        :param score: The score of the first player, 1, 0.5 or 0.
+        :return: The decision after this game, see decision.
+        """
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+        self.trajectory.append((self.games, self.llr()))
+        return self.decision()
+
+    def score_stats(self):
+        """The mean and the variance of the score of a single game.
+        """
+        wins, draws, losses = (count + RESULTS_PRIOR for count in (self.wins, self.draws, self.losses))
+        games = wins + draws + losses
+        mean = (wins + 0.5 * draws) / games
+        variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / games
+        return mean, variance
+
+    def llr(self):
+        """The log-likelihood ratio of H1 against H0.
+        """
+        if self.games == 0:
+            return 0.0
+        mean, variance = self.score_stats()
+        score0 = elo_to_score(self.elo0)
+        score1 = elo_to_score(self.elo1)
+        return self.games * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+    def decision(self):
+        """
+        :return: ACCEPT_H1 or ACCEPT_H0 once the log-likelihood ratio leaves the bounds, None before.
+        """
+        llr = self.trajectory[-1][1] if self.trajectory else 0.0
+        if llr >= self.upper_bound:
+            return ACCEPT_H1
+        if llr <= self.lower_bound:
+            return ACCEPT_H0
+        return None
+
+    def elo(self):
+        """The Elo difference estimated from the results, with its 95% error bars.
+
+        :return: A tuple: (the estimate, the lower end, the upper end)
+        """
+        mean, variance = self.score_stats()
+        margin = CONFIDENCE_QUANTILE * math.sqrt(variance / max(self.games, 1))
+        return score_to_elo(mean), score_to_elo(mean - margin), score_to_elo(mean + margin)
+
+    def __str__(self):
+        elo, elo_low, elo_high = self.elo()
+        return 'games: {} (+{} ={} -{}), elo: {:.1f} [{:.1f}, {:.1f}], LLR: {:.2f} [{:.2f}, {:.2f}]'.format(
+            self.games, self.wins, self.draws, self.losses, elo, elo_low, elo_high,
+            self.trajectory[-1][1] if self.trajectory else 0.0, self.lower_bound, self.upper_bound)
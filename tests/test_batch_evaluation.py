@@ -0,0 +1,18 @@
+import pytest
+
+from checkers import STATE_ENGINES
+from checkers.consts import RED_PLAYER, BLACK_PLAYER
+from players.batch_evaluation import BatchEvaluation, np
+from players.evaluation1 import Evaluation
+from run_bench import playout_states
+
+
+@pytest.mark.skipif(np is None, reason='the batch evaluation requires numpy')
+@pytest.mark.parametrize('engine', sorted(STATE_ENGINES))
+def test_batch_utilities_equal_the_scalar_utility(engine):
+    states = playout_states(STATE_ENGINES[engine], games=5)
+    for color in (RED_PLAYER, BLACK_PLAYER):
+        batch_evaluation = BatchEvaluation(color)
+        scalar_evaluation = Evaluation(color)
+        utilities = batch_evaluation.utilities([batch_evaluation.leaf(state) for state in states])
+        assert utilities == [scalar_evaluation.utility(state) for state in states]
@@ -0,0 +1,38 @@
+import pytest
+
+from checkers import STATE_ENGINES
+from checkers.board import GameState
+from checkers.moves import GameMove
+from checkers.positions import CAPTURE_POSITIONS, standard_states, encode_board
+from run_bench import playout_states, recursive_capture_sequences
+
+
+def resulting_positions(state, moves):
+    positions = []
+    for move in moves:
+        undo_record = state.perform_move(move)
+        positions.append(encode_board(state.board))
+        state.undo_move(undo_record)
+    return positions
+
+
+def capture_states():
+    states = standard_states(GameState, CAPTURE_POSITIONS) + playout_states(GameState, games=10)
+    return [state for state in states if state.calc_capture_moves()]
+
+
+@pytest.mark.parametrize('engine', sorted(STATE_ENGINES))
+def test_capture_moves_lead_to_the_positions_of_every_route(engine):
+    states = capture_states()
+    assert len(states) > len(CAPTURE_POSITIONS)
+    for state in states:
+        # Every route of every capture sequence, as the former recursive search found them.
+        origins = set(origin for origin, _, _ in state.calc_capture_moves())
+        reference_moves = [GameMove(state.board[origin], origin, target, seq)
+                           for origin in origins
+                           for target, seq in recursive_capture_sequences(state, origin, origin, [])]
+        engine_state = STATE_ENGINES[engine].from_board(state.board, state.curr_player)
+        positions = resulting_positions(engine_state, engine_state.calc_possible_moves())
+        assert set(positions) == set(resulting_positions(state, reference_moves))
+        # No two moves lead to the same position.
+        assert len(set(positions)) == len(positions)
@@ -0,0 +1,78 @@
+import pytest
+
+from checkers.board import GameState
+from checkers.consts import RED_PLAYER, BLACK_PLAYER, RP, RK, BP, BK, PAWN_COLOR, MY_COLORS
+from players.evaluation import Evaluation, EvalsEnum, CriteriaEval
+from players.features import protection_counts
+from run_bench import playout_states
+
+
+def per_piece_counts(evaluation, state, color):
+    locs = [loc for loc, val in state.board.items() if val in MY_COLORS[color]]
+    protected = sum(evaluation.is_protected(state, PAWN_COLOR[color], loc) for loc in locs)
+    can_be_taken = sum(not evaluation.is_protected(state, PAWN_COLOR[color], loc) and
+                       evaluation.is_can_be_taken(state, PAWN_COLOR[color], loc) for loc in locs)
+    return protected, can_be_taken
+
+
+def test_protection_counts_match_the_per_piece_checks():
+    evaluation = Evaluation(RED_PLAYER)
+    for state in playout_states(GameState, games=5):
+        for color in (RED_PLAYER, BLACK_PLAYER):
+            locs = [loc for loc, val in state.board.items() if val in MY_COLORS[color]]
+            assert protection_counts(state.board, locs, color) == per_piece_counts(evaluation, state, color)
+
+
+@pytest.mark.parametrize('board, counts', [
+    # A black pawn ahead of the red pawn, and the square behind it is empty.
+    ({(3, 3): RP, (4, 4): BP}, (0, 1)),
+    # A black king behind the red pawn, and the square ahead of it is empty.
+    ({(3, 3): RP, (2, 2): BK}, (0, 1)),
+    # A black pawn behind the red pawn cannot jump back.
+    ({(3, 3): RP, (2, 2): BP}, (0, 0)),
+    # The square the black pawn would land on is taken.
+    ({(3, 3): RP, (4, 4): BP, (2, 2): BP}, (0, 0)),
+    # A protected red king is not counted as a piece that can be taken, and the red pawns behind it are neither.
+    ({(3, 3): RK, (4, 4): BP, (2, 2): RP, (2, 4): RP}, (1, 0)),
+    # Two red pawns that can be taken, one by each black piece.
+    ({(3, 3): RP, (4, 4): BP, (3, 1): RP, (2, 0): BK}, (0, 2)),
+])
+def test_protection_counts_of_positions(board, counts):
+    state = GameState.from_board(board, BLACK_PLAYER)
+    locs = [loc for loc, val in state.board.items() if val in MY_COLORS[RED_PLAYER]]
+    assert protection_counts(state.board, locs, RED_PLAYER) == counts
+    assert per_piece_counts(Evaluation(RED_PLAYER), state, RED_PLAYER) == counts
+    # The pieces counted are the pieces black can capture.
+    jumped = {loc for move in state.get_possible_moves() for loc in move.jumped_locs}
+    assert len(jumped) == counts[1]
+
+
+def loc_evaluations(board, color, incremental):
+    state = GameState.from_board(board, BLACK_PLAYER)
+    evaluation = Evaluation(color)
+    evaluation.my_evals = [0] * EvalsEnum.evals_num
+    evaluation.oppo_evals = [0] * EvalsEnum.evals_num
+    if incremental:
+        evaluation.loc_evaluation_incremental(state, state.piece_locs())
+    else:
+        evaluation.loc_evaluation(state, state.piece_locs())
+    return evaluation.my_evals[EvalsEnum.LOCS], evaluation.oppo_evals[EvalsEnum.LOCS]
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_loc_evaluation_counts_the_threatened_pieces_of_their_owner(incremental):
+    # The black king can take the red pawn, the same king away from it threatens nothing. No other term changes.
+    threatened = {(3, 3): RP, (2, 2): BK}
+    safe = {(3, 3): RP, (2, 6): BK}
+    for color, red_index in ((RED_PLAYER, 0), (BLACK_PLAYER, 1)):
+        threatened_evals = loc_evaluations(threatened, color, incremental)
+        safe_evals = loc_evaluations(safe, color, incremental)
+        assert threatened_evals[red_index] - safe_evals[red_index] == CriteriaEval.CAN_BE_TAKEN
+        assert threatened_evals[1 - red_index] == safe_evals[1 - red_index]
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_loc_evaluation_of_a_piece_next_to_a_piece_of_its_owner(incremental):
+    # A red pawn with another red pawn ahead of it is not threatened, as if the other pawn was away from it.
+    assert (loc_evaluations({(3, 3): RP, (4, 4): RP, (6, 0): BP}, RED_PLAYER, incremental) ==
+            loc_evaluations({(3, 3): RP, (4, 6): RP, (6, 0): BP}, RED_PLAYER, incremental))
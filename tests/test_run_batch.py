@@ -0,0 +1,78 @@
+import sys
+import threading
+import types
+
+import pytest
+
+import players.random_player
+import run_batch
+from checkers.consts import RED_PLAYER, BLACK_PLAYER
+from utils import run_with_limited_time, ExceededTimeError
+
+OVERRUN_MOVE = 3
+
+
+class OverrunPlayer(players.random_player.Player):
+    """A player whose search on its OVERRUN_MOVE-th move takes twice its time, and is cancelled by
+    run_with_limited_time. The search performs a move on the state, and undoes it only when it is cancelled.
+    """
+
+    def __init__(self, setup_time, player_color, time_per_k_turns, k):
+        players.random_player.Player.__init__(self, setup_time, player_color, time_per_k_turns, k)
+        self.moves = 0
+
+    def get_move(self, game_state, possible_moves):
+        self.moves += 1
+        if self.moves == OVERRUN_MOVE:
+            cancel_event = threading.Event()
+
+            def search(state):
+                undo_record = state.perform_move(possible_moves[0])
+                while not cancel_event.is_set():
+                    pass
+                state.undo_move(undo_record)
+
+            try:
+                run_with_limited_time(search, (game_state,), {}, 2 * self.time_per_k_turns, cancel_event)
+            except ExceededTimeError:
+                pass
+        return possible_moves[0]
+
+
+class ChangingPlayer(players.random_player.Player):
+    # A player that returns the state it got with its move performed on it.
+    def get_move(self, game_state, possible_moves):
+        game_state.perform_move(possible_moves[0])
+        return possible_moves[0]
+
+
+class BackgroundChangingPlayer(ChangingPlayer):
+    background_search = True
+
+
+def run_game_with(monkeypatch, player_class, black_player='random_player'):
+    module = types.ModuleType('players.test_player')
+    module.Player = player_class
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    runner = run_batch.HeadlessGameRunner(2, 0.05, 5, 'test_player', black_player)
+    return runner, runner.run()
+
+
+def test_player_that_overruns_its_time_loses(monkeypatch):
+    runner, winner = run_game_with(monkeypatch, OverrunPlayer)
+    assert winner[0] == BLACK_PLAYER
+    assert runner.end_reason == run_batch.EXCEEDED_TIME
+    # The moves before the overrun were played, on the state the cancelled search restored.
+    assert runner.plies == 2 * (OVERRUN_MOVE - 1)
+    assert runner.player_times[RED_PLAYER] >= 0.05
+
+
+def test_player_that_changes_the_state(monkeypatch):
+    with pytest.raises(RuntimeError):
+        run_game_with(monkeypatch, ChangingPlayer)
+
+
+def test_player_that_searches_in_the_background_gets_a_copy(monkeypatch):
+    runner, winner = run_game_with(monkeypatch, BackgroundChangingPlayer)
+    assert runner.end_reason in (run_batch.NO_MOVES, run_batch.NO_JUMPS)
+    assert runner.plies > 0
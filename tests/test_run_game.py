@@ -0,0 +1,21 @@
+import contextlib
+import io
+
+import run_game
+
+
+def play_verbose_game(red_player, black_player, time_per_k_turns):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        winner = run_game.GameRunner(2, time_per_k_turns, 5, 'y', red_player, black_player).run()
+    # The winner is a tuple of the color and the player, only the color is the same in every game.
+    return winner if winner == run_game.TIE else winner[0], output.getvalue()
+
+
+def test_fixed_depth_players_are_not_timed():
+    # 1ms for every 5 moves is much less than any search of depth 2 takes.
+    winner, output = play_verbose_game('simple_player:fixed_depth=2', 'simple_player:fixed_depth=1', 0.001)
+    assert 'exceeded' not in output
+    assert output.count('performed the move') > 10
+    # The game is the same in every run.
+    assert play_verbose_game('simple_player:fixed_depth=2', 'simple_player:fixed_depth=1', 0.001) == (winner, output)
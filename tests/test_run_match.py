@@ -0,0 +1,21 @@
+import time
+
+import run_match
+import run_test
+
+
+def fake_single_test(round_time, red, black, seed=None):
+    # The games of the first seeds are the longest, so the games end in the reverse order. The first player wins
+    # the even seeds only.
+    time.sleep(0.05 * (4 - seed))
+    red_score, black_score = (1, 0) if (red == 'p1') == (seed % 2 == 0) else (0, 1)
+    return [red, black, round_time, red_score, black_score]
+
+
+def test_parallel_results_are_added_in_the_order_of_the_games(monkeypatch):
+    monkeypatch.setattr(run_test, 'run_single_test', fake_single_test)
+    monkeypatch.setattr(run_test, 'physical_cores', lambda: 4)
+    serial = run_match.run_match('p1', 'p2', 1, max_games=8, workers=1)
+    parallel = run_match.run_match('p1', 'p2', 1, max_games=8, workers=4)
+    assert parallel.games == serial.games == 8
+    assert parallel.trajectory == serial.trajectory
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from checkers.board import GameState
+from run_bench import run_fixed_depth_search, playout_states
+from transposition import TranspositionTable
+from utils import run_with_limited_time, ExceededTimeError
+
+
+def test_cancelled_function_returns_before_the_time_error():
+    # A function that changes its argument in place, and checks the cancel event only after 0.2s.
+    state = []
+    cancel_event = threading.Event()
+
+    def search(state):
+        state.append('performed move')
+        time.sleep(0.2)
+        state.pop()
+
+    with pytest.raises(ExceededTimeError):
+        run_with_limited_time(search, (state,), {}, 0.01, cancel_event)
+    assert cancel_event.is_set()
+    assert state == []
+
+
+def test_next_function_does_not_wait_for_a_timed_out_one():
+    release = threading.Event()
+    with pytest.raises(ExceededTimeError):
+        run_with_limited_time(release.wait, (), {}, 0.01)
+    try:
+        result, _ = run_with_limited_time(lambda: 42, (), {}, 0.5)
+        assert result == 42
+    finally:
+        release.set()
+
+
+def test_result_and_exception_of_a_function():
+    result, run_time = run_with_limited_time(sum, ([1, 2, 3],), {}, 1)
+    assert result == 6 and run_time >= 0
+    with pytest.raises(ZeroDivisionError):
+        run_with_limited_time(lambda: 1 / 0, (), {}, 1)
+
+
+def test_transposition_table_scores_do_not_cross_the_no_jump_draw():
+    # The table is filled by searches far from the draw, and reused by searches of the same positions whose leaves
+    # are at the draw, unless a capture resets the counter.
+    for state in playout_states(GameState, games=3)[::7]:
+        table = TranspositionTable(1)
+        run_fixed_depth_search(GameState.from_board(state.board, state.curr_player, 0), 4,
+                               transposition_table=table)
+        late_state = GameState.from_board(state.board, state.curr_player, 48.5)
+        (value, _), _, _ = run_fixed_depth_search(late_state, 4, transposition_table=table)
+        (expected_value, _), _, _ = run_fixed_depth_search(late_state, 4)
+        assert value == expected_value
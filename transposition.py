@@ -0,0 +1,95 @@
+"""A bounded transposition table for the MiniMax search, keyed by the Zobrist key of the game state.
+"""
+
+# The kind of bound the stored score is, relative to the alpha-beta window it was searched with.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# A rough size of one stored entry (the tuple and its fields) in bytes, used to turn a memory budget
+# into a number of slots.
+ENTRY_SIZE = 160
+
+
+class TranspositionTable:
+    def __init__(self, size_mb):
+        """Initialize an empty table.
+
+        :param size_mb: The memory budget of the table in megabytes. The table holds a fixed number of slots,
+                        one entry each, and never grows beyond it.
+        """
+        self.size = max(1, int(size_mb * 2 ** 20) // ENTRY_SIZE)
+        # Each slot is None or a tuple: (key, depth, bound, score, best move, generation).
+        self.entries = [None] * self.size
+        # Increased for every new search, so entries of older searches are the first to be replaced.
+        self.generation = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def new_search(self):
+        """Marking the start of a new search. The stored entries stay, but are preferred for replacement.
+        """
+        self.generation += 1
+
+    def probe(self, key):
+        """Looking up a position.
+
+        :param key: The Zobrist key of the position.
+        :return: The stored (key, depth, bound, score, best move, generation) tuple, or None if missing.
+        """
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is None:
+            return None
+        if entry[0] != key:
+            # The slot is taken by another position.
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, bound, score, best_move):
+        """Storing the result of a search of a position.
+
+        An entry of another position is replaced only if it is from an older search, or it was searched
+        to a smaller or equal depth. An entry of the same position is replaced unless it is deeper.
+        :param key: The Zobrist key of the position.
+        :param depth: The depth the position was searched to.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param score: The search result.
+        :param best_move: The best move found, or None.
+        """
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is not None and entry[5] == self.generation and entry[1] > depth:
+            return
+        if entry is not None and entry[0] == key and entry[1] > depth:
+            return
+        self.entries[index] = (key, depth, bound, score, best_move, self.generation)
+        self.stores += 1
+
+    def export_entries(self, min_depth=0):
+        """The entries stored by the current search, to continue it with another table (e.g. of another process).
+
+        :param min_depth: The smallest searched depth of an exported entry. The shallow entries are the most, and the
+                          cheapest to search again.
+        :return: A list of (key, depth, bound, score, best move) tuples, see import_entries.
+        """
+        return [entry[:5] for entry in self.entries
+                if entry is not None and entry[5] == self.generation and entry[1] >= min_depth]
+
+    def import_entries(self, entries):
+        """Storing the entries exported by another table, by the replacement rules of store.
+        """
+        for entry in entries:
+            self.store(*entry)
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    def __str__(self):
+        return 'transposition table: {} probes, {} hits ({:.1%}), {} stores, {} collisions'.format(
+            self.probes, self.hits, self.hits / self.probes if self.probes else 0, self.stores, self.collisions)
@@ -1,10 +1,12 @@
 """Generic utility functions
 """
 # from __future__ import print_function
-from threading import Thread
-from queue import Queue
+from threading import Thread, Lock, local
+from queue import Queue, Empty
 import time
 import copy
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+from checkers.consts import MAX_TURNS_NO_JUMP
 
 INFINITY = float(6000)
 
@@ -15,56 +17,180 @@ class ExceededTimeError(RuntimeError):
     pass
 
 
-def function_wrapper(func, args, kwargs, result_queue):
+def function_wrapper(func, args, kwargs):
     """Runs the given function and measures its runtime.
 
     :param func: The function to run.
     :param args: The function arguments as tuple.
     :param kwargs: The function kwargs as dict.
-    :param result_queue: The inter-process queue to communicate with the parent.
-    :return: A tuple: The function return value, and its runtime.
+    :return: A tuple: The function return value, and its runtime. Or the exception the function raised.
     """
     start = time.process_time()
     try:
         result = func(*args, **kwargs)
-    except MemoryError as e:
-        result_queue.put(e)
-        return
+    except Exception as e:
+        return e
 
     runtime = time.process_time() - start
-    result_queue.put((result, runtime))
+    return result, runtime
 
 
-def run_with_limited_time(func, args, kwargs, time_limit):
+class LimitedTimeWorker:
+    def __init__(self):
+        """Starting a long-lived thread that runs the functions of run_with_limited_time, one at a time.
+
+        A thread cannot be killed, so a function that exceeded its time keeps running until it returns. A function
+        with a cancel event (e.g. checked in the no_more_time of a search) is waited for until it stops, as it may
+        change its arguments in place. Any other function is left running, and the worker is busy until it returns,
+        so run_with_limited_time runs the next function on a new worker.
+        """
+        self.tasks = Queue()
+        self.results = Queue()
+        self.task_id = 0
+        # The last task that exceeded its time. The lock makes skipping or starting a task, and timing it out, atomic.
+        self.timed_out_id = 0
+        # The task the thread is running, or 0.
+        self.running_id = 0
+        self.lock = Lock()
+        self.thread = Thread(target=self.main_loop, daemon=True)
+        self.thread.start()
+
+    def main_loop(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                # The worker was replaced while busy, see run_with_limited_time.
+                break
+            task_id, func, args, kwargs, cancel_event = task
+            with self.lock:
+                if task_id <= self.timed_out_id:
+                    # Timed out before it started.
+                    self.results.put((task_id, ExceededTimeError()))
+                    continue
+                if cancel_event is not None:
+                    cancel_event.clear()
+                self.running_id = task_id
+            result = function_wrapper(func, args, kwargs)
+            with self.lock:
+                self.running_id = 0
+            self.results.put((task_id, result))
+
+    def is_busy(self):
+        """Whether a function that exceeded its time is still running.
+        """
+        return self.running_id != 0
+
+    def stop(self):
+        """Letting the thread exit once its current function returns.
+        """
+        self.tasks.put(None)
+
+    def run(self, func, args, kwargs, time_limit, cancel_event=None):
+        """See run_with_limited_time.
+        """
+        self.task_id += 1
+        self.tasks.put((self.task_id, func, args, kwargs, cancel_event))
+
+        # This is just for limiting the runtime of the worker thread, so we stop eventually.
+        # It doesn't really measure the runtime.
+        result = self.wait_result(time.perf_counter() + time_limit)
+        if result is None:
+            with self.lock:
+                self.timed_out_id = self.task_id
+                if cancel_event is not None:
+                    cancel_event.set()
+            if cancel_event is not None:
+                # Letting the function stop, and restore any state it changed in place, before returning. Returning
+                # earlier would leave the caller with a state the function is still changing.
+                self.wait_result(None)
+            raise ExceededTimeError
+
+        result = result[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def wait_result(self, deadline):
+        """Waiting for the result of the last task, results of earlier tasks that exceeded their time are dropped.
+
+        :param deadline: The time.perf_counter() time to stop waiting at, or None to wait until the task returns.
+        :return: A tuple of the result, or None if the deadline passed.
+        """
+        while True:
+            try:
+                task_id, result = self.results.get(
+                    timeout=None if deadline is None else max(deadline - time.perf_counter(), 0))
+            except Empty:
+                return None
+            if task_id == self.task_id:
+                return result,
+
+
+# The LimitedTimeWorker of each calling thread, so a function run with limited time can do the same.
+_workers = local()
+
+
+def run_with_limited_time(func, args, kwargs, time_limit, cancel_event=None):
     """Runs a function with time limit
 
     :param func: The function to run.
     :param args: The functions args, given as tuple.
     :param kwargs: The functions keywords, given as dict.
     :param time_limit: The time limit in seconds (can be float).
+    :param cancel_event: An optional threading.Event that is set if the function exceeded its time, so the function
+                         can stop. It is cleared when the function starts. The ExceededTimeError is raised only
+                         after the function returned, so it must stop soon after the event is set.
     :return: A tuple: The function's return value unchanged, and the running time for the function.
     :raises PlayerExceededTimeError: If player exceeded its given time.
     """
-    q = Queue()
-    t = Thread(target=function_wrapper, args=(func, args, kwargs, q))
-    t.start()
+    worker = getattr(_workers, 'worker', None)
+    if worker is not None and worker.is_busy():
+        # A function without a cancel event exceeded its time and is still running, the next one gets the whole of
+        # its time on a new thread.
+        worker.stop()
+        worker = None
+    if worker is None:
+        worker = _workers.worker = LimitedTimeWorker()
+    return worker.run(func, args, kwargs, time_limit, cancel_event)
+
 
-    # This is just for limiting the runtime of the other thread, so we stop eventually.
-    # It doesn't really measure the runtime.
-    t.join(time_limit)
+class RootResult:
+    def __init__(self, depth):
+        """The best root move of a search so far, published as each root move completes.
 
-    if t.is_alive():
-        raise ExceededTimeError
+        When the search of the root runs out of time, the values of the completed root moves are still valid: the
+        first one is exact, and any later one that was better is exact as well (others are only upper bounds).
+        So if the first searched root move was the best move of the last completed iteration, the best move so far
+        is either the same move, or a move proven better at this depth.
+        :param depth: The depth of the search.
+        """
+        self.depth = depth
+        # The first root move whose search was completed, None until then.
+        self.first_move = None
+        self.move = None
+        self.value = -INFINITY
+        self.completed_moves = 0
+
+    def publish(self, move, value):
+        """Recording the value of a root move whose search was completed.
+        """
+        if self.first_move is None:
+            self.first_move = move
+        if self.move is None or value > self.value:
+            self.move, self.value = move, value
+        self.completed_moves += 1
 
-    q_get = q.get()
-    if isinstance(q_get, MemoryError):
-        raise q_get
-    return q_get
+    def improves(self, best_move):
+        """Whether the best move so far is a safe replacement for the best move of the last completed iteration.
+        """
+        return self.first_move == best_move and self.move is not None and self.move != best_move
 
 
 class MiniMaxWithAlphaBetaPruning:
 
-    def __init__(self, utility, my_color, no_more_time, selective_deepening):
+    def __init__(self, utility, my_color, no_more_time, selective_deepening, in_place=False,
+                 transposition_table=None, move_ordering=None, quiescence_depth=0, batch_evaluation=None,
+                 staged_moves=False):
         """Initialize a MiniMax algorithms with alpha-beta pruning.
 
         :param utility: The utility function. Should have state as parameter.
@@ -74,13 +200,44 @@ class MiniMaxWithAlphaBetaPruning:
         :param selective_deepening: A functions that gets the current state, and
                         returns True when the algorithm should continue the search
                         for the minimax value recursivly from this state.
+        :param in_place: Whether to search on the given state itself, performing and undoing each move on it,
+                         instead of deep-copying the state for every child. The state is restored when the
+                         search returns, and the minimax values are the same in both modes.
+        :param transposition_table: An optional transposition.TranspositionTable, to reuse the results of
+                                    positions searched before, in this search or in earlier ones.
+        :param move_ordering: An optional move_ordering.MoveOrdering, to search the most promising moves first.
+                              Without it, the moves are searched in the order they are generated, except for the
+                              transposition table move.
+        :param quiescence_depth: The maximal number of capture plies searched beyond the depth limit, or 0 to
+                                 use selective_deepening instead. When positive, the leaves of the search are
+                                 evaluated by a quiescence search that expands capture moves only, and can stop at
+                                 any ply with the static utility (stand pat).
+        :param batch_evaluation: An optional object that evaluates many states in one call, with the same values as
+                                 utility (see players.batch_evaluation.BatchEvaluation). When given, and there is no
+                                 quiescence search, the children of each node at depth 1 are evaluated together.
+        :param staged_moves: Whether to generate the moves of each node in stages with state.iter_moves, the hash
+                             move first, so a node that is cut off early does not generate all its moves. The
+                             move ordering, if any, sorts the moves within each stage.
         """
         self.utility = utility
         self.my_color = my_color
         self.no_more_time = no_more_time
         self.selective_deepening = selective_deepening
+        self.in_place = in_place
+        self.transposition_table = transposition_table
+        self.move_ordering = move_ordering
+        self.quiescence_depth = quiescence_depth
+        self.batch_evaluation = batch_evaluation if quiescence_depth == 0 else None
+        self.staged_moves = staged_moves
+        # The number of nodes visited by all the searches of this instance, the quiescence nodes included.
+        self.nodes = 0
+        # The number of quiescence nodes, and the deepest quiescence ply reached.
+        self.quiescence_nodes = 0
+        self.max_quiescence_ply = 0
+        # The best root move of the last search of a max root, see RootResult.
+        self.root_result = RootResult(0)
 
-    def search(self, state, depth, alpha, beta, maximizing_player):
+    def search(self, state, depth, alpha, beta, maximizing_player, ply=0):
         """Start the MiniMax algorithm.
 
         :param state: The state to start from.
@@ -88,36 +245,213 @@ class MiniMaxWithAlphaBetaPruning:
         :param alpha: The alpha of the alpha-beta pruning.
         :param alpha: The beta of the alpha-beta pruning.
         :param maximizing_player: Whether this is a max node (True) or a min node (False).
+        :param ply: The distance of the state from the root of the search, 0 when called from outside.
         :return: A tuple: (The alpha-beta algorithm value, The move in case of max node or None in min mode)
         """
-        if self.no_more_time() or (depth <= 0 and not self.selective_deepening(state)):
+        self.nodes += 1
+        if self.no_more_time():
             return self.utility(state), None
+        if depth <= 0:
+            if self.quiescence_depth > 0:
+                return self.quiescence(state, alpha, beta, maximizing_player, 0), None
+            if not self.selective_deepening(state):
+                return self.utility(state), None
+
+        hash_move = None
+        alpha_orig, beta_orig = alpha, beta
+        use_table = self.transposition_table is not None and not self.may_reach_no_jump_draw(state, depth)
+        if use_table:
+            entry = self.transposition_table.probe(state.zobrist_key)
+            if entry is not None:
+                _, entry_depth, bound, score, hash_move, _ = entry
+                # The root is always searched, so a move is returned even if the root score is known.
+                if ply > 0 and entry_depth >= depth:
+                    if bound == EXACT:
+                        return score, hash_move if maximizing_player else None
+                    elif bound == LOWER_BOUND:
+                        alpha = max(alpha, score)
+                    else:
+                        beta = min(beta, score)
+                    if beta <= alpha:
+                        return score, hash_move if maximizing_player else None
+
+        if self.staged_moves and not (depth == 1 and self.batch_evaluation is not None):
+            if not state.has_any_move():
+                # This player has no moves. So the previous player is the winner.
+                return INFINITY if state.curr_player != self.my_color else -INFINITY, None
+            next_moves = self.iter_moves(state, ply, hash_move)
+        else:
+            next_moves = state.get_possible_moves()
+            if not next_moves:
+                # This player has no moves. So the previous player is the winner.
+                return INFINITY if state.curr_player != self.my_color else -INFINITY, None
 
-        next_moves = state.get_possible_moves()
-        if not next_moves:
-            # This player has no moves. So the previous player is the winner.
-            return INFINITY if state.curr_player != self.my_color else -INFINITY, None
+            if self.move_ordering is not None:
+                next_moves = self.move_ordering.order_moves(next_moves, ply, hash_move)
+            elif hash_move is not None and hash_move in next_moves:
+                # Searching the best move of a previous search first.
+                i = next_moves.index(hash_move)
+                next_moves = [next_moves[i]] + next_moves[:i] + next_moves[i + 1:]
 
+        leaf_values = None
+        if depth == 1 and self.batch_evaluation is not None:
+            leaf_values = self.evaluate_leaves(state, next_moves)
+
+        # The first move is selected if no move is better than the initial bound.
+        selected_move = None
         if maximizing_player:
-            selected_move = next_moves[0]
+            if ply == 0:
+                self.root_result = RootResult(depth)
             best_move_utility = -INFINITY
-            for move in next_moves:
-                new_state = copy.deepcopy(state)
-                new_state.perform_move(move)
-                minimax_value, _ = self.search(new_state, depth - 1, alpha, beta, False)
+            for i, move in enumerate(next_moves):
+                if leaf_values is not None and leaf_values[i] is not None:
+                    minimax_value = leaf_values[i]
+                else:
+                    new_state, undo_record = self.perform_move(state, move)
+                    minimax_value, _ = self.search(new_state, depth - 1, alpha, beta, False, ply + 1)
+                    self.undo_move(state, undo_record)
+                if ply == 0 and not self.no_more_time():
+                    self.root_result.publish(move, minimax_value)
                 alpha = max(alpha, minimax_value)
-                if minimax_value > best_move_utility:
+                if minimax_value > best_move_utility or selected_move is None:
                     best_move_utility = minimax_value
                     selected_move = move
-                if beta <= alpha or self.no_more_time():
+                if beta <= alpha:
+                    self.record_cutoff(move, depth, ply)
+                    break
+                if self.no_more_time():
                     break
-            return alpha, selected_move
+            value = alpha
 
         else:
-            for move in next_moves:
-                new_state = copy.deepcopy(state)
-                new_state.perform_move(move)
-                beta = min(beta, self.search(new_state, depth - 1, alpha, beta, True)[0])
-                if beta <= alpha or self.no_more_time():
+            best_move_utility = INFINITY
+            for i, move in enumerate(next_moves):
+                if leaf_values is not None and leaf_values[i] is not None:
+                    minimax_value = leaf_values[i]
+                else:
+                    new_state, undo_record = self.perform_move(state, move)
+                    minimax_value, _ = self.search(new_state, depth - 1, alpha, beta, True, ply + 1)
+                    self.undo_move(state, undo_record)
+                beta = min(beta, minimax_value)
+                if minimax_value < best_move_utility or selected_move is None:
+                    best_move_utility = minimax_value
+                    selected_move = move
+                if beta <= alpha:
+                    self.record_cutoff(move, depth, ply)
+                    break
+                if self.no_more_time():
                     break
-            return beta, None
+            value = beta
+
+        # A search that ran out of time is not complete, and must not be reused.
+        if use_table and not self.no_more_time():
+            if value <= alpha_orig:
+                bound = UPPER_BOUND
+            elif value >= beta_orig:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            self.transposition_table.store(state.zobrist_key, depth, bound, value, selected_move)
+        if ply == 0 and self.move_ordering is not None and not self.no_more_time():
+            self.move_ordering.record_pv(selected_move)
+
+        return value, selected_move if maximizing_player else None
+
+    @staticmethod
+    def may_reach_no_jump_draw(state, depth):
+        """Whether the search of the state may reach the draw of MAX_TURNS_NO_JUMP turns without a jump.
+
+        The transposition table is keyed by the position only, without the turns counter, so the score of such a
+        search must neither be reused for nor taken from a visit of the position with another counter. Every ply
+        adds half a turn. The number of plies of a selectively deepened node (depth <= 0) is not known.
+        """
+        return depth <= 0 or state.turns_since_last_jump + 0.5 * depth >= MAX_TURNS_NO_JUMP
+
+    def iter_moves(self, state, ply, hash_move):
+        """The staged moves of a node, see staged_moves.
+        """
+        if self.move_ordering is None:
+            return state.iter_moves(hash_move)
+
+        def order(moves):
+            # The hash move is still ranked first in its stage if the principal variation move is yielded first.
+            return self.move_ordering.order_moves(moves, ply, hash_move)
+        first_move = self.move_ordering.pv_move if ply == 0 and self.move_ordering.pv_move is not None else hash_move
+        return state.iter_moves(first_move, order)
+
+    def evaluate_leaves(self, state, next_moves):
+        """Evaluating the children of a node at depth 1 in one batch.
+
+        All the children are evaluated, also those an alpha-beta cutoff would skip, and the search loop then goes
+        over the values in the same order, so the result is the same as evaluating them one by one.
+        :return: The utility of each child, or None for a child that is selectively deepened and must be searched.
+        """
+        leaves = []
+        for move in next_moves:
+            new_state, undo_record = self.perform_move(state, move)
+            leaves.append(None if self.selective_deepening(new_state) else self.batch_evaluation.leaf(new_state))
+            self.undo_move(state, undo_record)
+        batch = [leaf for leaf in leaves if leaf is not None]
+        values = iter(self.batch_evaluation.utilities(batch))
+        self.nodes += len(batch)
+        return [None if leaf is None else next(values) for leaf in leaves]
+
+    def quiescence(self, state, alpha, beta, maximizing_player, q_ply):
+        """Searching the capture moves only, from a leaf of the main search.
+
+        :param q_ply: The number of capture plies searched since the leaf.
+        :return: The alpha-beta value of the state.
+        """
+        if q_ply > 0:
+            self.nodes += 1
+        self.quiescence_nodes += 1
+        self.max_quiescence_ply = max(self.max_quiescence_ply, q_ply)
+
+        stand_pat = self.utility(state)
+        if q_ply >= self.quiescence_depth or self.no_more_time() or not state.calc_capture_moves():
+            return stand_pat
+
+        # The player to move may stop capturing, so the static utility bounds the value.
+        if maximizing_player:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+        # Captures are mandatory, so all the moves are captures. The longest are searched first.
+        next_moves = sorted(state.get_possible_moves(), key=lambda move: len(move.jumped_locs), reverse=True)
+        for move in next_moves:
+            new_state, undo_record = self.perform_move(state, move)
+            minimax_value = self.quiescence(new_state, alpha, beta, not maximizing_player, q_ply + 1)
+            self.undo_move(state, undo_record)
+            if maximizing_player:
+                alpha = max(alpha, minimax_value)
+            else:
+                beta = min(beta, minimax_value)
+            if beta <= alpha or self.no_more_time():
+                break
+        return alpha if maximizing_player else beta
+
+    def record_cutoff(self, move, depth, ply):
+        if self.move_ordering is not None:
+            self.move_ordering.record_cutoff(move, depth, ply)
+
+    def perform_move(self, state, move):
+        """Getting the child state of the given state after the move.
+
+        :return: A tuple: (The child state, The undo record to pass to undo_move)
+        """
+        if self.in_place:
+            return state, state.perform_move(move)
+        new_state = copy.deepcopy(state)
+        new_state.perform_move(move)
+        return new_state, None
+
+    def undo_move(self, state, undo_record):
+        """Restoring the given state after its child has been searched.
+        """
+        if self.in_place:
+            state.undo_move(undo_record)